@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import tempfile
+from typing import List
+
+# Measures how long a fresh worker process needs to import the client, import a module with
+# ``n`` config classes, create a client with consumers for all of them and decode the first
+# config. Every measurement runs in a new interpreter so that nothing is cached.
+
+_MEASUREMENT = """
+from time import perf_counter
+start = perf_counter()
+from training_scheduler.client import SchedulingClient
+from training_scheduler.directory_adapters import LocalDirectoryAdapter
+from training_scheduler.config import load_config
+t_import = perf_counter()
+import generated_configs
+t_classes = perf_counter()
+sc = SchedulingClient(LocalDirectoryAdapter({base_dir!r}), callback=None)
+for cls in generated_configs.CLASSES:
+    sc.register_config(cls, lambda config, identifier: None)
+t_client = perf_counter()
+load_config("!trainingconfig/GeneratedConfig0\\nvalue: 1")
+t_decode = perf_counter()
+print(t_import - start, t_classes - t_import, t_client - t_classes, t_decode - t_client)
+"""
+
+
+def _write_config_module(path: str, n: int) -> None:
+    lines: List[str] = ["from dataclasses import dataclass",
+                        "from training_scheduler.config import trainingconfig", ""]
+    for i in range(n):
+        lines += ["@trainingconfig", "@dataclass", f"class GeneratedConfig{i}:",
+                  "    value: int = 0", ""]
+    lines.append("CLASSES = [" + ", ".join(f"GeneratedConfig{i}" for i in range(n)) + "]")
+    with open(os.path.join(path, "generated_configs.py"), 'w') as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def measure(n: int, repetitions: int = 5) -> List[float]:
+    """
+    Returns the best time in seconds over ``repetitions`` runs for each startup phase with ``n``
+    config classes: importing the client, importing the config classes, registering them with
+    a client and decoding the first config.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_config_module(tmp, n)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([tmp, os.getcwd()]))
+        script = _MEASUREMENT.format(base_dir=os.path.join(tmp, "runs"))
+        runs = [[float(t) for t in subprocess.run([sys.executable, "-c", script], env=env,
+                                                  check=True, capture_output=True,
+                                                  text=True).stdout.split()]
+                for _ in range(repetitions)]
+    return [min(phase) for phase in zip(*runs)]
+
+
+if __name__ == "__main__":
+    print(f"{'classes':>8} {'import':>10} {'classes':>10} {'client':>10} {'decode':>10} "
+          f"{'total':>10}  (ms)")
+    for n in (1, 10, 100, 1000, 5000):
+        phases = measure(n)
+        print(f"{n:>8}", *(f"{t * 1000:>10.1f}" for t in phases + [sum(phases)]))
@@ -0,0 +1,131 @@
+import hashlib
+import threading
+import xml.etree.ElementTree as ET
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+
+class InProcessObjectStore:
+    """
+    A minimal stand-in for an S3-compatible object store serving a single bucket from memory.
+    It supports paginated listing, get / put / copy / delete of objects and multi-object delete.
+    """
+
+    def __init__(self, bucket: str = "test-bucket"):
+        self.bucket = bucket
+        self.objects: Dict[str, bytes] = dict()
+        self.requests: Counter = Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+def _make_handler(store: InProcessObjectStore):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _parse(self):
+            url = urlsplit(self.path)
+            parts = unquote(url.path).lstrip("/").split("/", 1)
+            assert parts[0] == store.bucket
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            return (parts[1] if len(parts) > 1 else ""), dict(parse_qsl(url.query,
+                                                                        keep_blank_values=True)), body
+
+        def _send(self, status: int, body: bytes = b"", headers: Dict[str, str] = None):
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            key, query, _ = self._parse()
+            with store.lock:
+                if not key and query.get("list-type") == "2":
+                    store.requests["list"] += 1
+                    return self._send(200, self._list(query))
+                store.requests["get"] += 1
+                if key not in store.objects:
+                    return self._send(404, b"<Error><Code>NoSuchKey</Code></Error>")
+                data = store.objects[key]
+                if self.headers.get("If-None-Match") == _etag(data):
+                    return self._send(304, headers={"ETag": _etag(data)})
+                return self._send(200, data, {"ETag": _etag(data)})
+
+        def _list(self, query) -> bytes:
+            prefix = query.get("prefix", "")
+            delimiter = query.get("delimiter")
+            max_keys = int(query.get("max-keys", 1000))
+            start = query.get("continuation-token", "")
+            keys = sorted(k for k in store.objects if k.startswith(prefix) and k > start
+                          and not (delimiter and delimiter in k[len(prefix):]))
+            page, truncated = keys[:max_keys], len(keys) > max_keys
+
+            root = ET.Element("ListBucketResult",
+                              xmlns="http://s3.amazonaws.com/doc/2006-03-01/")
+            for key in page:
+                content = ET.SubElement(root, "Contents")
+                ET.SubElement(content, "Key").text = key
+                ET.SubElement(content, "ETag").text = _etag(store.objects[key])
+            ET.SubElement(root, "IsTruncated").text = "true" if truncated else "false"
+            if truncated:
+                ET.SubElement(root, "NextContinuationToken").text = page[-1]
+            return ET.tostring(root)
+
+        def do_PUT(self):
+            key, _, body = self._parse()
+            with store.lock:
+                source = self.headers.get("x-amz-copy-source")
+                if source is not None:
+                    store.requests["copy"] += 1
+                    source_key = unquote(source).lstrip("/").split("/", 1)[1]
+                    if source_key not in store.objects:
+                        return self._send(404, b"<Error><Code>NoSuchKey</Code></Error>")
+                    if self.headers.get("If-None-Match") == "*" and key in store.objects:
+                        return self._send(412, b"<Error><Code>PreconditionFailed</Code></Error>")
+                    store.objects[key] = store.objects[source_key]
+                    return self._send(200, b"<CopyObjectResult></CopyObjectResult>")
+                store.requests["put"] += 1
+                store.objects[key] = body
+                return self._send(200, headers={"ETag": _etag(body)})
+
+        def do_DELETE(self):
+            key, _, _ = self._parse()
+            with store.lock:
+                store.requests["delete"] += 1
+                store.objects.pop(key, None)
+                return self._send(204)
+
+        def do_POST(self):
+            _, query, body = self._parse()
+            assert "delete" in query
+            with store.lock:
+                store.requests["delete_many"] += 1
+                for key in ET.fromstring(body).iter("Key"):
+                    store.objects.pop(key.text, None)
+                return self._send(200, b"<DeleteResult></DeleteResult>")
+
+    return Handler
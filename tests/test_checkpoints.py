@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import socket
+import unittest
+from dataclasses import dataclass, asdict
+from time import time
+
+from training_scheduler.checkpoints import Checkpoint, Lease
+from training_scheduler.client import SchedulingClient
+from training_scheduler.config import trainingconfig
+from training_scheduler.directory_adapters import LocalDirectoryAdapter
+
+
+@trainingconfig
+@dataclass
+class CheckpointedConfig:
+    epochs: int = 3
+
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self) -> None:
+        self.active_run_dir = os.path.join("test_dir", "active")
+        self.completed_run_dir = os.path.join("test_dir", "completed")
+        self.adapter = LocalDirectoryAdapter("test_dir")
+
+        with open(os.path.join(self.active_run_dir, 'test_config.yaml'), 'w') as file:
+            file.write("!trainingconfig/CheckpointedConfig\nepochs: 3\n")
+
+        self.started_from = []
+        self.leases = []
+
+        def consumer(config: CheckpointedConfig, identifier: str, checkpoint: Checkpoint):
+            start = checkpoint.last["epoch"] + 1 if checkpoint.last is not None else 0
+            self.started_from.append(start)
+            self.leases.append(Lease.read(self.adapter, identifier))
+            for epoch in range(start, config.epochs):
+                checkpoint.save({"epoch": epoch})
+
+        self.sc = SchedulingClient(directory_adapter=self.adapter, min_polling_interval=1,
+                                   timeout=1, callback=None, worker_id="this-worker")
+        self.sc.register_config(CheckpointedConfig, consumer, checkpointing=True)
+
+    def tearDown(self) -> None:
+        shutil.rmtree("test_dir")
+
+    def _write_lease(self, **kwargs):
+        lease = Lease(**{"worker_id": "other-worker", "host": "other-host", "pid": 1,
+                         "heartbeat": time(), **kwargs})
+        self.adapter.write_metadata("test_config.yaml", Lease.name, json.dumps(asdict(lease)))
+
+    def test_resumed_config_continues_from_last_checkpoint(self):
+        self.adapter.write_metadata("test_config.yaml", Checkpoint.name, json.dumps({"epoch": 1}))
+
+        self.sc.run(debug=True, resume_active_configs=True)
+
+        self.assertEqual(self.started_from, [2])
+        self.assertTrue(os.path.isfile(os.path.join(self.completed_run_dir, "test_config.yaml")))
+
+    def test_metadata_is_deleted_when_config_is_finished(self):
+        self.sc.run(debug=True, resume_active_configs=True)
+        self.assertIsNone(Checkpoint(self.adapter, "test_config.yaml").last)
+        self.assertIsNone(Lease.read(self.adapter, "test_config.yaml"))
+
+        # planning the config again starts it from scratch
+        os.rename(os.path.join(self.completed_run_dir, "test_config.yaml"),
+                  os.path.join("test_dir", "planned", "test_config.yaml"))
+        sc = SchedulingClient(directory_adapter=LocalDirectoryAdapter("test_dir"),
+                              min_polling_interval=1, timeout=1, callback=None)
+        sc.register_config(CheckpointedConfig, self.sc.config_consumers[CheckpointedConfig],
+                           checkpointing=True)
+        sc.run(debug=True)
+        self.assertEqual(self.started_from, [0, 0])
+
+    def test_config_of_live_worker_is_not_resumed(self):
+        self._write_lease()
+
+        self.sc.run(debug=True, resume_active_configs=True)
+
+        self.assertEqual(self.started_from, [])
+        self.assertTrue(os.path.isfile(os.path.join(self.active_run_dir, "test_config.yaml")))
+
+    def test_config_of_dead_worker_is_resumed(self):
+        self._write_lease(heartbeat=time() - 1000)
+
+        self.sc.run(debug=True, resume_active_configs=True)
+
+        self.assertEqual(self.started_from, [0])
+        self.assertEqual(self.leases[0].worker_id, "this-worker")
+
+    def test_checkpointing_requires_metadata_support(self):
+        class NoMetadataAdapter(LocalDirectoryAdapter):
+            supports_metadata = False
+
+        adapter = NoMetadataAdapter("test_dir")
+        sc = SchedulingClient(directory_adapter=adapter, callback=None)
+        with self.assertRaises(ValueError):
+            sc.register_config(CheckpointedConfig, lambda c, i, cp: None, checkpointing=True)
+        self.assertNotIn(CheckpointedConfig, sc.config_consumers)
+        self.assertIsNone(Lease.read(adapter, "test_config.yaml"))
+
+    @unittest.skipUnless(os.name == "posix", "process checks are only done on posix systems")
+    def test_lease_of_exited_process_on_same_host_is_dead(self):
+        lease = Lease("other-worker", socket.gethostname(), 2 ** 22 + 1, time())
+        self.assertFalse(lease.is_alive(lease_timeout=1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -168,6 +168,14 @@ class TestSchedulingClient(unittest.TestCase):
         with self.assertRaises(expected_exception=Exception):
             self.sc.run(debug=True)
 
+    def test_configs_with_unknown_tags_are_not_loaded(self):
+        with open(os.path.join(self.planned_run_dir, 'unknown.yaml'), 'w') as file:
+            file.write("!not_a_trainingconfig\ntest_string: null\n")
+
+        adapter = LocalDirectoryAdapter("test_dir")
+        self.assertEqual(adapter.poll(), ["unknown.yaml"])
+        self.assertIsNone(adapter.get_config("unknown.yaml"))
+
     def test_if_active_configs_can_be_resumed(self):
         @trainingconfig
         @dataclass
@@ -1,6 +1,8 @@
+import subprocess
+import sys
 import unittest
 from typing import List
-from training_scheduler.config import trainingconfig, ConfigCodec
+from training_scheduler.config import trainingconfig, ConfigCodec, load_config
 from dataclasses import dataclass
 import yaml
 
@@ -21,5 +23,61 @@ class TestConfig(unittest.TestCase):
         obj_again = yaml.safe_load(str_again)
         self.assertEqual(obj, obj_again)
 
+    def test_if_classes_decorated_after_registration_can_be_loaded(self):
+        ConfigCodec.register_with_pyyaml()
+
+        @trainingconfig
+        @dataclass
+        class _LateConfig:
+            some_int: int
+
+        obj = load_config("!trainingconfig/_LateConfig\nsome_int: 3")
+        self.assertEqual(obj, _LateConfig(3))
+        self.assertEqual(load_config(yaml.dump(obj)), obj)
+
+    def test_if_yaml_is_only_imported_on_first_decode(self):
+        script = "\n".join([
+            "import sys",
+            "from dataclasses import dataclass",
+            "import training_scheduler.client",
+            "from training_scheduler.config import trainingconfig, load_config",
+            "@trainingconfig",
+            "@dataclass",
+            "class _EarlyConfig:",
+            "    some_int: int",
+            "assert 'yaml' not in sys.modules and 'yamlable' not in sys.modules",
+            "assert load_config('!trainingconfig/_EarlyConfig\\nsome_int: 3') == _EarlyConfig(3)",
+        ])
+        subprocess.run([sys.executable, "-c", script], check=True)
+
+    def test_if_classes_decorated_after_importing_yaml_work_with_plain_yaml(self):
+        script = "\n".join([
+            "import yaml",
+            "from dataclasses import dataclass",
+            "from training_scheduler.config import trainingconfig",
+            "@trainingconfig",
+            "@dataclass",
+            "class _PlainConfig:",
+            "    some_int: int",
+            "assert yaml.dump(_PlainConfig(3)).startswith('!trainingconfig/_PlainConfig')",
+            "assert yaml.safe_load('!trainingconfig/_PlainConfig\\nsome_int: 3') == _PlainConfig(3)",
+        ])
+        subprocess.run([sys.executable, "-c", script], check=True)
+
+    def test_if_dump_config_works_before_yaml_is_imported(self):
+        script = "\n".join([
+            "import sys",
+            "from dataclasses import dataclass",
+            "from training_scheduler.config import trainingconfig, dump_config, load_config",
+            "@trainingconfig",
+            "@dataclass",
+            "class _EarlyConfig:",
+            "    some_int: int",
+            "assert 'yaml' not in sys.modules",
+            "assert load_config(dump_config(_EarlyConfig(3))) == _EarlyConfig(3)",
+        ])
+        subprocess.run([sys.executable, "-c", script], check=True)
+
+
 if __name__ == '__main__':
     unittest.main()
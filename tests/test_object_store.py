@@ -0,0 +1,203 @@
+import unittest
+from dataclasses import dataclass
+from typing import Optional
+
+from tests.object_store_server import InProcessObjectStore
+from training_scheduler.client import SchedulingClient
+from training_scheduler.config import trainingconfig
+from training_scheduler.directory_adapters import ConfigState, ConfigNotFoundError
+from training_scheduler.object_store import ObjectStoreDirectoryAdapter
+
+
+@trainingconfig
+@dataclass
+class ObjectStoreConfig:
+    test_string: Optional[str] = None
+
+
+class TestObjectStoreDirectoryAdapter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.store = InProcessObjectStore().__enter__()
+        self.adapter = ObjectStoreDirectoryAdapter(self.store.endpoint_url, self.store.bucket,
+                                                   prefix="runs/", access_key="key",
+                                                   secret_key="secret", page_size=10)
+
+    def tearDown(self) -> None:
+        self.adapter.close()
+        self.store.__exit__(None, None, None)
+
+    def _add_config(self, state: str, name: str, test_string: str = "abc"):
+        data = f"!trainingconfig/ObjectStoreConfig\ntest_string: {test_string}\n"
+        self.store.objects[f"runs/{state}/{name}"] = data.encode()
+
+    def test_poll_follows_pagination_and_filters_prefix(self):
+        for i in range(25):
+            self._add_config("planned", f"config_{i:02d}.yaml")
+        self._add_config("planned", "not_a_config.txt")
+        self._add_config("active", "active.yaml")
+        self.store.objects["other/planned/x.yaml"] = b""
+
+        identifiers = self.adapter.poll()
+
+        self.assertEqual(sorted(identifiers), [f"config_{i:02d}.yaml" for i in range(25)])
+        self.assertEqual(self.store.requests["list"], 3)
+
+    def test_get_config_uses_etags_to_skip_downloads(self):
+        self._add_config("planned", "config.yaml")
+        self.adapter.poll()
+
+        config = self.adapter.get_config("config.yaml")
+        self.assertEqual(config, ObjectStoreConfig("abc"))
+        self.adapter.poll()
+        self.assertEqual(self.adapter.get_config("config.yaml"), config)
+        self.assertEqual(self.store.requests["get"], 1)
+
+        # a changed object must be downloaded again
+        self._add_config("planned", "config.yaml", "def")
+        self.adapter.poll()
+        self.assertEqual(self.adapter.get_config("config.yaml"), ObjectStoreConfig("def"))
+        self.assertEqual(self.store.requests["get"], 2)
+
+    def test_caches_only_hold_configs_of_the_last_listing(self):
+        for name in ("claimed.yaml", "removed.yaml", "kept.yaml"):
+            self._add_config("planned", name)
+        self.adapter.poll()
+        for name in ("claimed.yaml", "removed.yaml", "kept.yaml"):
+            self.adapter.get_config(name)
+
+        self.adapter.change_state("claimed.yaml", ConfigState.active)
+        del self.store.objects["runs/planned/removed.yaml"]
+        self.adapter.poll()
+
+        self.assertEqual(list(self.adapter._config_cache), ["kept.yaml"])
+        self.assertEqual(list(self.adapter._listed_etags[ConfigState.planned]), ["kept.yaml"])
+
+    def test_state_changes_move_objects(self):
+        self._add_config("planned", "config.yaml")
+        self.adapter.poll()
+        self.adapter.change_state("config.yaml", ConfigState.active)
+        self.assertEqual(list(self.store.objects), ["runs/active/config.yaml"])
+
+        self.adapter.change_state("config.yaml", ConfigState.failed)
+        self.adapter.write_output("config.yaml", "first")
+        self.adapter.write_output("config.yaml", " second")
+        self.assertEqual(self.store.objects["runs/failed/config.yaml.out"], b"first second")
+
+    def _competing_adapter(self) -> ObjectStoreDirectoryAdapter:
+        adapter = ObjectStoreDirectoryAdapter(self.store.endpoint_url, self.store.bucket,
+                                              prefix="runs/")
+        self.addCleanup(adapter.close)
+        return adapter
+
+    def test_only_one_of_competing_adapters_claims_a_config(self):
+        self._add_config("planned", "config.yaml")
+        other = self._competing_adapter()
+        self.adapter.poll()
+        other.poll()
+
+        # the other adapter copied the config, but has not yet deleted the planned object
+        other._copy("runs/planned/config.yaml", "runs/active/config.yaml", exclusive=True)
+        with self.assertRaises(ConfigNotFoundError):
+            self.adapter.change_state("config.yaml", ConfigState.active)
+        self.assertNotIn("config.yaml", self.adapter.identifier_states)
+        # the losing adapter must not delete the planned object of the winner's claim
+        self.assertEqual(sorted(self.store.objects),
+                         ["runs/active/config.yaml", "runs/planned/config.yaml"])
+        self.assertEqual(self.store.requests["delete"], 0)
+
+    def test_get_config_of_claimed_config_raises_not_found(self):
+        self._add_config("planned", "config.yaml")
+        other = self._competing_adapter()
+        self.adapter.poll()
+        other.poll()
+
+        other.change_state("config.yaml", ConfigState.active)
+        with self.assertRaises(ConfigNotFoundError):
+            self.adapter.get_config("config.yaml")
+        self.assertNotIn("config.yaml", self.adapter.identifier_states)
+
+    def test_batched_state_changes_use_a_single_delete(self):
+        for i in range(5):
+            self._add_config("active", f"config_{i}.yaml")
+        identifiers = self.adapter.poll_directory(ConfigState.active)
+
+        self.adapter.change_states(identifiers, ConfigState.planned, validate_change=False)
+
+        self.assertEqual(sorted(self.adapter.poll()), sorted(identifiers))
+        self.assertEqual(self.store.requests["delete_many"], 1)
+        self.assertFalse(any(k.startswith("runs/active/") for k in self.store.objects))
+
+    def test_batched_state_changes_skip_configs_moved_by_another_adapter(self):
+        for i in range(3):
+            self._add_config("active", f"config_{i}.yaml")
+        other = self._competing_adapter()
+        identifiers = sorted(self.adapter.poll_directory(ConfigState.active))
+        other.poll_directory(ConfigState.active)
+
+        other.change_state("config_1.yaml", ConfigState.planned, validate_change=False)
+        moved = self.adapter.change_states(identifiers, ConfigState.planned,
+                                           validate_change=False)
+
+        self.assertEqual(moved, ["config_0.yaml", "config_2.yaml"])
+        self.assertNotIn("config_1.yaml", self.adapter.identifier_states)
+        self.assertEqual(sorted(self.store.objects),
+                         [f"runs/planned/config_{i}.yaml" for i in range(3)])
+
+    def test_competing_clients_can_resume_active_configs(self):
+        self._add_config("active", "config.yaml")
+        clients = [SchedulingClient(directory_adapter=adapter, callback=None)
+                   for adapter in (self.adapter, self._competing_adapter())]
+        for client in clients:
+            client.directory.poll_directory(ConfigState.active)
+
+        for client in clients:
+            client._resume_active_configs()
+
+        self.assertEqual(list(self.store.objects), ["runs/planned/config.yaml"])
+
+    def test_progress_is_written_in_chunks(self):
+        self.adapter.write_progress("config.yaml", '{"step": 0}\n')
+        self.adapter.write_progress("config.yaml", '{"step": 1}\n')
+
+        # a new adapter continues the numbering of existing chunks
+        adapter = ObjectStoreDirectoryAdapter(self.store.endpoint_url, self.store.bucket,
+                                              prefix="runs/")
+        adapter.write_progress("config.yaml", '{"step": 2}\n')
+        adapter.close()
+
+        self.assertEqual(sorted(self.store.objects), [
+            f"runs/progress/config.yaml/{i:08d}.jsonl" for i in range(3)])
+
+    def test_progress_of_finished_configs_is_archived(self):
+        self._add_config("active", "config.yaml")
+        self.adapter.poll_directory(ConfigState.active)
+        self.adapter.write_progress("config.yaml", '{"step": 0}\n')
+        self.adapter.write_progress("config.yaml", '{"step": 1}\n')
+
+        self.adapter.change_state("config.yaml", ConfigState.completed)
+        self.adapter.archive_progress("config.yaml")
+
+        self.assertEqual(sorted(self.store.objects), ["runs/completed/config.yaml",
+                                                      "runs/completed/config.yaml.progress.jsonl"])
+        self.assertEqual(self.store.objects["runs/completed/config.yaml.progress.jsonl"],
+                         b'{"step": 0}\n{"step": 1}\n')
+        self.assertEqual(self.adapter._progress_chunks, dict())
+
+    def test_client_runs_configs_from_object_store(self):
+        self._add_config("active", "resumed.yaml")
+        self._add_config("planned", "config.yaml")
+        consumed = []
+
+        sc = SchedulingClient(directory_adapter=self.adapter, min_polling_interval=1, timeout=1,
+                              callback=None)
+        sc.register_config(ObjectStoreConfig, lambda c, i: consumed.append(i))
+        sc.run(debug=True, resume_active_configs=True)
+
+        self.assertEqual(sorted(consumed), ["config.yaml", "resumed.yaml"])
+        # the leases of finished configs are deleted
+        self.assertEqual(sorted(self.store.objects),
+                         ["runs/completed/config.yaml", "runs/completed/resumed.yaml"])
+
+
+if __name__ == '__main__':
+    unittest.main()
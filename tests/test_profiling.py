@@ -0,0 +1,75 @@
+import os
+import pstats
+import shutil
+import unittest
+from dataclasses import dataclass
+from typing import Optional
+
+from training_scheduler.client import SchedulingClient
+from training_scheduler.config import trainingconfig
+from training_scheduler.directory_adapters import LocalDirectoryAdapter
+from training_scheduler.profiling import ProfilingOptions
+
+
+@trainingconfig
+@dataclass
+class ProfiledConfig:
+    test_string: Optional[str] = None
+
+
+def consumer(config: ProfiledConfig, identifier: str):
+    data = [list(range(100)) for _ in range(100)]
+    return None if data else "unreachable"
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self) -> None:
+        self.planned_run_dir = os.path.join("test_dir", "planned")
+        self.completed_run_dir = os.path.join("test_dir", "completed")
+        os.makedirs(self.planned_run_dir)
+
+        data = "!trainingconfig/ProfiledConfig\ntest_string: null\n"
+        with open(os.path.join(self.planned_run_dir, 'test_config.yaml'), 'w') as file:
+            file.write(data)
+
+    def tearDown(self) -> None:
+        shutil.rmtree("test_dir")
+
+    def _run(self, profiling: Optional[ProfilingOptions] = None,
+             class_profiling: Optional[ProfilingOptions] = None):
+        sc = SchedulingClient(directory_adapter=LocalDirectoryAdapter("test_dir"),
+                              min_polling_interval=1, timeout=1, profiling=profiling)
+        sc.register_config(ProfiledConfig, consumer, profiling=class_profiling)
+        sc.run(debug=True)
+
+    def test_profiles_are_written_next_to_the_config(self):
+        self._run(ProfilingOptions(cprofile=True, tracemalloc=True))
+
+        prof_path = os.path.join(self.completed_run_dir, "test_config.yaml.prof")
+        self.assertTrue(os.path.isfile(prof_path))
+        stats = pstats.Stats(prof_path)
+        self.assertTrue(any(name == "consumer" for _, _, name in stats.stats))  # type: ignore
+
+        with open(os.path.join(self.completed_run_dir, "test_config.yaml.mem.txt")) as file:
+            self.assertIn("peak", file.read())
+
+    def test_no_profiles_are_written_by_default(self):
+        self._run()
+        self.assertEqual(os.listdir(self.completed_run_dir), ["test_config.yaml"])
+
+    def test_class_options_override_client_options(self):
+        self._run(ProfilingOptions(), class_profiling=ProfilingOptions(sampling_rate=0))
+        self.assertEqual(os.listdir(self.completed_run_dir), ["test_config.yaml"])
+
+    def test_runs_are_not_profiled_without_artifact_support(self):
+        class NoArtifactsAdapter(LocalDirectoryAdapter):
+            supports_artifacts = False
+
+        sc = SchedulingClient(directory_adapter=NoArtifactsAdapter("test_dir"),
+                              profiling=ProfilingOptions())
+        sc.register_config(ProfiledConfig, consumer)
+        self.assertIsNone(sc._create_profiler(ProfiledConfig))
+
+
+if __name__ == '__main__':
+    unittest.main()
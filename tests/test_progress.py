@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+import unittest
+from dataclasses import dataclass
+from time import sleep
+from typing import Optional
+
+from training_scheduler.client import SchedulingClient, SchedulingClientCallback
+from training_scheduler.config import trainingconfig
+from training_scheduler.directory_adapters import LocalDirectoryAdapter
+from training_scheduler.progress import ProgressWriter
+
+
+@trainingconfig
+@dataclass
+class StreamingConfig:
+    steps: int = 0
+
+
+class _RecordingCallback(SchedulingClientCallback):
+    def __init__(self):
+        self.records = []
+        self.failed = []
+        self.completed = []
+        self.write_errors = []
+
+    def on_progress(self, identifier, config, record):
+        self.records.append(record)
+
+    def on_config_failed(self, identifier, config, return_value):
+        self.failed.append(return_value)
+
+    def on_config_completed(self, identifier, config):
+        self.completed.append(identifier)
+
+    def on_failed_to_write_progress(self, identifier, config, exception):
+        self.write_errors.append(exception)
+
+
+class _CountingAdapter(LocalDirectoryAdapter):
+    def __init__(self, base_dir):
+        super(_CountingAdapter, self).__init__(base_dir)
+        self.writes = 0
+
+    def write_progress(self, identifier: str, records: str) -> None:
+        self.writes += 1
+        super(_CountingAdapter, self).write_progress(identifier, records)
+
+
+class TestProgress(unittest.TestCase):
+    def setUp(self) -> None:
+        self.planned_run_dir = os.path.join("test_dir", "planned")
+        os.makedirs(self.planned_run_dir)
+        self.progress_file = os.path.join("test_dir", "progress", "test_config.yaml.jsonl")
+        self.failed_progress_file = os.path.join("test_dir", "failed",
+                                                 "test_config.yaml.progress.jsonl")
+
+    def tearDown(self) -> None:
+        shutil.rmtree("test_dir")
+
+    def _write_config(self, steps: int):
+        with open(os.path.join(self.planned_run_dir, 'test_config.yaml'), 'w') as file:
+            file.write(f"!trainingconfig/StreamingConfig\nsteps: {steps}\n")
+
+    def _read_progress(self, path: Optional[str] = None):
+        with open(path or self.progress_file) as file:
+            return [json.loads(line) for line in file]
+
+    def test_generator_consumer_streams_progress(self):
+        def consumer(config: StreamingConfig, identifier: str):
+            for step in range(config.steps):
+                yield {"step": step}
+            return "result"
+
+        self._write_config(steps=5)
+        callback = _RecordingCallback()
+        sc = SchedulingClient(directory_adapter=LocalDirectoryAdapter("test_dir"),
+                              min_polling_interval=1, timeout=1, callback=callback)
+        sc.register_config(StreamingConfig, consumer)
+        sc.run(debug=True)
+
+        expected = [{"step": step} for step in range(5)]
+        self.assertEqual(callback.records, expected)
+        self.assertEqual(callback.failed, ["result"])
+        self.assertEqual(self._read_progress(self.failed_progress_file), expected)
+
+    def test_progress_is_written_before_consumer_fails(self):
+        def consumer(config: StreamingConfig, identifier: str):
+            yield {"step": 0}
+            raise Exception("Pretending not to work.")
+
+        self._write_config(steps=1)
+        sc = SchedulingClient(directory_adapter=LocalDirectoryAdapter("test_dir"),
+                              min_polling_interval=1, timeout=1, callback=None)
+        sc.register_config(StreamingConfig, consumer)
+        sc.run(debug=False)
+
+        self.assertEqual(self._read_progress(self.failed_progress_file), [{"step": 0}])
+
+    def test_progress_of_a_config_planned_again_starts_empty(self):
+        def consumer(config: StreamingConfig, identifier: str):
+            for step in range(config.steps):
+                yield {"step": step}
+
+        completed_config = os.path.join("test_dir", "completed", "test_config.yaml")
+        completed_progress_file = completed_config + ".progress.jsonl"
+        for steps in (3, 2):
+            self._write_config(steps)
+            sc = SchedulingClient(directory_adapter=LocalDirectoryAdapter("test_dir"),
+                                  min_polling_interval=1, timeout=1, callback=None)
+            sc.register_config(StreamingConfig, consumer)
+            sc.run(debug=True)
+            os.remove(completed_config)
+
+        self.assertEqual(self._read_progress(completed_progress_file), [{"step": 0}, {"step": 1}])
+        self.assertFalse(os.path.exists(self.progress_file))
+
+    def test_consumer_completes_without_progress_support(self):
+        class NoProgressAdapter(LocalDirectoryAdapter):
+            supports_progress = False
+
+        def consumer(config: StreamingConfig, identifier: str):
+            for step in range(config.steps):
+                yield {"step": step}
+
+        self._write_config(steps=3)
+        callback = _RecordingCallback()
+        sc = SchedulingClient(directory_adapter=NoProgressAdapter("test_dir"),
+                              min_polling_interval=1, timeout=1, callback=callback,
+                              progress_flush_interval=0)
+        sc.register_config(StreamingConfig, consumer)
+        sc.run(debug=True)
+
+        self.assertEqual(callback.completed, ["test_config.yaml"])
+        self.assertEqual(callback.records, [{"step": step} for step in range(3)])
+        self.assertEqual(callback.write_errors, [])
+        self.assertFalse(os.path.exists(self.progress_file))
+
+    def test_consumer_completes_if_progress_cannot_be_written(self):
+        class FailingAdapter(LocalDirectoryAdapter):
+            def write_progress(self, identifier: str, records: str) -> None:
+                raise OSError("No space left on device")
+
+        def consumer(config: StreamingConfig, identifier: str):
+            for step in range(config.steps):
+                yield {"step": step}
+
+        self._write_config(steps=3)
+        callback = _RecordingCallback()
+        sc = SchedulingClient(directory_adapter=FailingAdapter("test_dir"),
+                              min_polling_interval=1, timeout=1, callback=callback,
+                              progress_flush_interval=0)
+        sc.register_config(StreamingConfig, consumer)
+        sc.run(debug=True)
+
+        self.assertEqual(callback.completed, ["test_config.yaml"])
+        self.assertEqual(callback.records, [{"step": step} for step in range(3)])
+        # the error is reported once, then streaming is skipped
+        self.assertEqual(len(callback.write_errors), 1)
+        self.assertIsInstance(callback.write_errors[0], OSError)
+
+    def test_writer_flushes_while_consumer_does_not_yield(self):
+        adapter = _CountingAdapter("test_dir")
+        with ProgressWriter(adapter, "test_config.yaml", flush_interval=0.1) as writer:
+            writer.write({"step": 0})
+            for _ in range(50):
+                with writer._lock:
+                    if not writer._buffer:
+                        break
+                sleep(0.1)
+            self.assertEqual(self._read_progress(), [{"step": 0}])
+        self.assertEqual(adapter.writes, 1)
+
+    def test_writer_flushes_when_buffer_is_full(self):
+        adapter = _CountingAdapter("test_dir")
+        with ProgressWriter(adapter, "test_config.yaml", buffer_size=100,
+                            flush_interval=1000) as writer:
+            for step in range(100):
+                writer.write({"step": step})
+                self.assertLess(writer._buffered_bytes, 100)
+
+        self.assertGreater(adapter.writes, 1)
+        self.assertEqual(self._read_progress(), [{"step": step} for step in range(100)])
+
+
+if __name__ == '__main__':
+    unittest.main()
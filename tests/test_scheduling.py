@@ -0,0 +1,164 @@
+import json
+import os
+import shutil
+import unittest
+from dataclasses import dataclass, asdict
+from time import time
+from typing import Optional
+
+from training_scheduler.checkpoints import Lease, LeaseKeeper
+from training_scheduler.client import SchedulingClient
+from training_scheduler.config import trainingconfig
+from training_scheduler.directory_adapters import LocalDirectoryAdapter, ConfigState
+from training_scheduler.scheduling import FairShareQueue
+
+
+@trainingconfig
+@dataclass
+class SweepConfig:
+    submitter: Optional[str] = None
+
+
+@trainingconfig
+@dataclass
+class InteractiveConfig:
+    submitter: Optional[str] = None
+
+
+class TestFairShareQueue(unittest.TestCase):
+    def _drain(self, queue: FairShareQueue, **kwargs):
+        order = []
+        while True:
+            entry = queue.pop(**kwargs)
+            if entry is None:
+                return order
+            order.append(entry[0])
+
+    def test_classes_are_interleaved_according_to_weights(self):
+        queue = FairShareQueue(class_weights={SweepConfig: 2., InteractiveConfig: 1.})
+        for i in range(6):
+            queue.push(f"sweep_{i}", SweepConfig())
+        for i in range(3):
+            queue.push(f"interactive_{i}", InteractiveConfig())
+
+        order = self._drain(queue)
+
+        self.assertEqual(order, ["sweep_0", "sweep_1", "interactive_0",
+                                 "sweep_2", "sweep_3", "interactive_1",
+                                 "sweep_4", "sweep_5", "interactive_2"])
+        self.assertEqual(len(queue), 0)
+
+    def test_submitters_share_a_class(self):
+        queue = FairShareQueue(submitter_field="submitter")
+        for i in range(3):
+            queue.push(f"alice_{i}", SweepConfig("alice"))
+        queue.push("bob_0", SweepConfig("bob"))
+
+        self.assertEqual(self._drain(queue), ["alice_0", "bob_0", "alice_1", "alice_2"])
+
+    def test_classes_that_are_not_allowed_are_skipped(self):
+        queue = FairShareQueue()
+        queue.push("sweep_0", SweepConfig())
+        queue.push("interactive_0", InteractiveConfig())
+
+        order = self._drain(queue, allowed=lambda cls: cls is not SweepConfig)
+
+        self.assertEqual(order, ["interactive_0"])
+        self.assertIn("sweep_0", queue)
+
+    def test_fractional_weights_accumulate(self):
+        queue = FairShareQueue(class_weights={SweepConfig: 1., InteractiveConfig: .5})
+        for i in range(4):
+            queue.push(f"sweep_{i}", SweepConfig())
+            queue.push(f"interactive_{i}", InteractiveConfig())
+
+        self.assertEqual(self._drain(queue)[:6], ["sweep_0", "sweep_1", "interactive_0",
+                                                  "sweep_2", "sweep_3", "interactive_1"])
+
+
+class TestFairShareInClient(unittest.TestCase):
+    def setUp(self) -> None:
+        self.planned_run_dir = os.path.join("test_dir", "planned")
+        os.makedirs(self.planned_run_dir)
+
+    def tearDown(self) -> None:
+        shutil.rmtree("test_dir")
+
+    def test_small_job_is_not_starved_by_sweep(self):
+        for i in range(10):
+            with open(os.path.join(self.planned_run_dir, f'sweep_{i}.yaml'), 'w') as file:
+                file.write("!trainingconfig/SweepConfig\nsubmitter: null\n")
+        with open(os.path.join(self.planned_run_dir, 'interactive.yaml'), 'w') as file:
+            file.write("!trainingconfig/InteractiveConfig\nsubmitter: null\n")
+
+        order = []
+        sc = SchedulingClient(directory_adapter=LocalDirectoryAdapter("test_dir"),
+                              min_polling_interval=1, timeout=1, callback=None)
+        sc.register_config(SweepConfig, lambda c, i: order.append(i))
+        sc.register_config(InteractiveConfig, lambda c, i: order.append(i))
+        sc.run(debug=True)
+
+        self.assertEqual(len(order), 11)
+        self.assertLessEqual(order.index("interactive.yaml"), 1)
+
+    def test_classes_at_their_limit_are_not_dispatched(self):
+        adapter = LocalDirectoryAdapter("test_dir")
+        with open(os.path.join("test_dir", "active", 'running.yaml'), 'w') as file:
+            file.write("!trainingconfig/SweepConfig\nsubmitter: null\n")
+        lease = Lease("other-worker", "other-host", 1, time(), "SweepConfig")
+        adapter.write_metadata("running.yaml", Lease.name, json.dumps(asdict(lease)))
+
+        with open(os.path.join(self.planned_run_dir, 'sweep.yaml'), 'w') as file:
+            file.write("!trainingconfig/SweepConfig\nsubmitter: null\n")
+        with open(os.path.join(self.planned_run_dir, 'interactive.yaml'), 'w') as file:
+            file.write("!trainingconfig/InteractiveConfig\nsubmitter: null\n")
+
+        order = []
+        sc = SchedulingClient(directory_adapter=adapter, min_polling_interval=1, timeout=1,
+                              callback=None)
+        sc.register_config(SweepConfig, lambda c, i: order.append(i), max_active=1)
+        sc.register_config(InteractiveConfig, lambda c, i: order.append(i))
+        sc.run(debug=True)
+
+        self.assertEqual(order, ["interactive.yaml"])
+        self.assertIn("sweep.yaml", sc.queue)
+
+    def test_class_limits_hold_across_clients_sharing_a_directory(self):
+        for name in ("first.yaml", "second.yaml"):
+            with open(os.path.join(self.planned_run_dir, name), 'w') as file:
+                file.write("!trainingconfig/SweepConfig\nsubmitter: null\n")
+
+        order = []
+        a, b = [SchedulingClient(directory_adapter=LocalDirectoryAdapter("test_dir"),
+                                 min_polling_interval=1, timeout=1, callback=None,
+                                 worker_id=f"worker-{i}") for i in range(2)]
+        for client in (a, b):
+            client.register_config(SweepConfig, lambda c, i: order.append(i), max_active=1)
+        a.directory.poll()
+        b.directory.poll()
+
+        # b claims the first config after a has seen it as planned
+        b.directory.change_state("first.yaml", ConfigState.active)
+        with LeaseKeeper(b.directory, "first.yaml", b.worker_id, 30., "SweepConfig"):
+            self.assertFalse(a._get_dispatch_filter()(SweepConfig))
+            a.run(debug=True)
+        # a config that a queued before b claimed it is skipped
+        a._run_config("first.yaml", SweepConfig(), debug=True)
+
+        self.assertEqual(order, [])
+        self.assertTrue(os.path.isfile(os.path.join(self.planned_run_dir, "second.yaml")))
+
+    def test_invalid_weight_does_not_register_the_consumer(self):
+        sc = SchedulingClient(directory_adapter=LocalDirectoryAdapter("test_dir"),
+                              callback=None)
+        with self.assertRaises(ValueError):
+            sc.register_config(SweepConfig, lambda c, i: None, weight=0)
+        self.assertNotIn(SweepConfig, sc.config_consumers)
+
+        # a retry with a valid weight succeeds
+        sc.register_config(SweepConfig, lambda c, i: None, weight=2)
+        self.assertEqual(sc.queue.class_weights[SweepConfig], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import unittest
+from dataclasses import dataclass
+from typing import Optional
+
+from training_scheduler.client import SchedulingClient, SchedulingClientCallback
+from training_scheduler.config import trainingconfig
+from training_scheduler.directory_adapters import LocalDirectoryAdapter
+from training_scheduler.records import RunRecord, RunRecordLog
+from training_scheduler.simulation import simulate, synthetic_workload, VirtualClock, \
+    SimulatedDirectoryAdapter, _SimulatedStore
+
+
+@trainingconfig
+@dataclass
+class RecordedConfig:
+    test_string: Optional[str] = None
+
+
+def _record(identifier: str, arrival: float, run_duration: float, config_class="A"):
+    return RunRecord(identifier, config_class, arrival, parse_time=0., start=0.,
+                     run_duration=run_duration, status="completed")
+
+
+class _FailureCallback(SchedulingClientCallback):
+    def __init__(self):
+        self.failures = []
+
+    def on_failed_to_run_config(self, identifier, config, exception):
+        self.failures.append(exception)
+
+
+class TestSimulation(unittest.TestCase):
+    def test_stopping_a_running_consumer_does_not_fail_its_config(self):
+        clock: VirtualClock
+        clock = VirtualClock(lambda: clock.now >= 10)
+        store = _SimulatedStore(clock, [_record("a", 0., 100.)], {"A": type("A", (), {})})
+        callback = _FailureCallback()
+        client = SchedulingClient(SimulatedDirectoryAdapter(store), 1, callback=callback,
+                                  heartbeat_interval=None)
+        client._time = clock.time
+        client._sleep = clock.sleep
+        client.register_config(store.config_classes["A"], lambda c, i: clock.sleep(100))
+
+        def ticker():
+            while True:
+                clock.sleep(1)
+
+        clock.run_workers([client.run, ticker])
+
+        self.assertEqual(callback.failures, [])
+        self.assertEqual(store.finish_times, dict())
+
+    def test_single_worker_runs_configs_sequentially(self):
+        records = [_record("a", 100., 10.), _record("b", 100., 10.), _record("c", 100., 10.)]
+
+        report = simulate(records, workers=1, min_polling_interval=5)
+
+        self.assertEqual(report.completed, 3)
+        self.assertEqual(report.makespan, 30.)
+        self.assertEqual(report.wait_percentiles[50], 10.)
+        self.assertEqual(report.wait_percentiles[99], 20.)
+        self.assertAlmostEqual(report.utilization, 1.)
+
+    def test_more_workers_reduce_waiting(self):
+        records = synthetic_workload(200, arrival_rate=1 / 10, mean_run_duration=30, seed=0)
+
+        one = simulate(records, workers=1)
+        four = simulate(records, workers=4)
+
+        self.assertEqual(one.completed, 200)
+        self.assertEqual(four.completed, 200)
+        self.assertLess(four.wait_percentiles[90], one.wait_percentiles[90])
+        self.assertLess(four.utilization, one.utilization)
+
+    def test_class_limits_are_respected(self):
+        records = [_record(f"{i}", 0., 10.) for i in range(4)]
+
+        limited = simulate(records, workers=4, min_polling_interval=1,
+                           class_settings={"A": {"max_active": 1}})
+        unlimited = simulate(records, workers=4, min_polling_interval=1)
+
+        self.assertGreaterEqual(limited.makespan, 40.)
+        self.assertLess(unlimited.makespan, 20.)
+
+
+class TestRunRecords(unittest.TestCase):
+    def setUp(self) -> None:
+        os.makedirs(os.path.join("test_dir", "planned"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree("test_dir")
+
+    def test_client_records_can_be_replayed(self):
+        for name in ("a.yaml", "b.yaml"):
+            with open(os.path.join("test_dir", "planned", name), 'w') as file:
+                file.write("!trainingconfig/RecordedConfig\ntest_string: null\n")
+
+        log = RunRecordLog(os.path.join("test_dir", "runs.jsonl"))
+        sc = SchedulingClient(directory_adapter=LocalDirectoryAdapter("test_dir"),
+                              min_polling_interval=1, timeout=1, callback=None,
+                              run_record_log=log)
+        sc.register_config(RecordedConfig, lambda c, i: None if i == "a.yaml" else "failed")
+        sc.run(debug=True)
+
+        records = log.load()
+        self.assertEqual(sorted((r.identifier, r.config_class, r.status) for r in records),
+                         [("a.yaml", "RecordedConfig", "completed"),
+                          ("b.yaml", "RecordedConfig", "failed")])
+        self.assertEqual(simulate(records).completed, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
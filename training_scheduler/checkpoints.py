@@ -0,0 +1,145 @@
+import json
+import os
+import socket
+import threading
+from dataclasses import dataclass, asdict
+from time import time
+from typing import Any, Optional
+
+from .directory_adapters import DirectoryAdapter
+
+
+class Checkpoint:
+    """
+    A handle passed to consumers registered with ``checkpointing=True``. It provides the metadata
+    of the last checkpoint of a config and allows to record new checkpoints through the
+    ``DirectoryAdapter``. The metadata must be json-serializable, e.g. a path to the model weights
+    and the current epoch.
+    """
+
+    name = "checkpoint"
+
+    def __init__(self, directory: DirectoryAdapter, identifier: str):
+        """
+        Create a handle for the config with the given ``identifier`` and load its last checkpoint.
+        :param directory: The adapter used to read and write checkpoints.
+        :param identifier: The identifier of the config.
+        """
+        self.directory = directory
+        self.identifier = identifier
+
+        data = directory.read_metadata(identifier, self.name)
+        self.last: Any = json.loads(data) if data is not None else None
+        """The metadata of the last checkpoint or None if there is none."""
+
+    def save(self, metadata: Any) -> None:
+        """
+        Records ``metadata`` as the latest checkpoint of the config.
+        :param metadata: json-serializable metadata describing the checkpoint.
+        """
+        self.directory.write_metadata(self.identifier, self.name, json.dumps(metadata))
+        self.last = metadata
+
+
+@dataclass
+class Lease:
+    """
+    Records which worker currently owns an active config. The owner refreshes ``heartbeat``
+    regularly while the consumer is running and releases the lease by setting it to 0 once the
+    consumer is done.
+    """
+    worker_id: str
+    host: str
+    pid: int
+    heartbeat: float
+    config_class: str = ""
+
+    name = "lease"
+
+    def is_alive(self, lease_timeout: float) -> bool:
+        """
+        Checks if the owner of this lease is still alive. An owner on the same host is dead if its
+        process does not exist anymore, otherwise its heartbeat must be more recent than
+        ``lease_timeout`` seconds.
+
+        :param lease_timeout: Number of seconds after which a heartbeat is outdated.
+        :return: True if the owner is considered to be alive.
+        """
+        if self.host == socket.gethostname() and not _process_exists(self.pid):
+            return False
+        return time() - self.heartbeat < lease_timeout
+
+    @classmethod
+    def read(cls, directory: DirectoryAdapter, identifier: str) -> Optional["Lease"]:
+        """
+        Reads the lease of the config with the given ``identifier``.
+        :return: The lease or None if there is none or the adapter does not support metadata.
+        """
+        if not directory.supports_metadata:
+            return None
+        data = directory.read_metadata(identifier, cls.name)
+        return cls(**json.loads(data)) if data is not None else None
+
+
+def _process_exists(pid: int) -> bool:
+    if os.name != "posix":
+        # os.kill sends a signal on Windows, so we rely on the heartbeat there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, but belongs to someone else
+        return True
+    return True
+
+
+class LeaseKeeper:
+    """
+    A context manager that writes a ``Lease`` for a config and refreshes its heartbeat every
+    ``heartbeat_interval`` seconds in a background thread until the context is exited, which
+    releases the lease.
+    """
+
+    def __init__(self, directory: DirectoryAdapter, identifier: str, worker_id: str,
+                 heartbeat_interval: float, config_class: str = ""):
+        """
+        Create a keeper for the lease of the config with the given ``identifier``.
+        :param directory: The adapter used to write the lease.
+        :param identifier: The identifier of the config.
+        :param worker_id: A unique identifier of the worker owning the config.
+        :param heartbeat_interval: Number of seconds between two heartbeats.
+        :param config_class: The name of the class of the config.
+        """
+        self.directory = directory
+        self.identifier = identifier
+        self.worker_id = worker_id
+        self.heartbeat_interval = heartbeat_interval
+        self.config_class = config_class
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._keep_alive, daemon=True)
+
+    def _write_lease(self, heartbeat: float) -> None:
+        lease = Lease(self.worker_id, socket.gethostname(), os.getpid(), heartbeat,
+                      self.config_class)
+        try:
+            self.directory.write_metadata(self.identifier, Lease.name, json.dumps(asdict(lease)))
+        except Exception:
+            # a missed heartbeat is not worth interrupting the consumer, the next one may succeed
+            pass
+
+    def _keep_alive(self) -> None:
+        while not self._stopped.wait(self.heartbeat_interval):
+            self._write_lease(time())
+
+    def __enter__(self):
+        self._write_lease(time())
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        self._thread.join()
+        self._write_lease(0.)
+        return False
@@ -1,12 +1,21 @@
+import inspect
 import json
+import os
+import socket
+import uuid
+from collections import Counter
+from contextlib import nullcontext
 from time import sleep, time
-from typing import Dict, Type, Callable, Any, Optional
+from typing import Dict, Type, Callable, Any, Optional, Set, Tuple
 
-from yamlable import YamlAble
+from .checkpoints import Checkpoint, Lease, LeaseKeeper
+from .directory_adapters import DirectoryAdapter, ConfigState, ConfigType, ConfigNotFoundError
+from .profiling import ProfilingOptions, ConsumerProfiler
+from .progress import ProgressWriter
+from .records import RunRecord, RunRecordLog
+from .scheduling import FairShareQueue
 
-from .directory_adapters import DirectoryAdapter, ConfigState, ConfigType
-
-ConsumerCallbackType = Callable[[YamlAble, str], Any]
+ConsumerCallbackType = Callable[[ConfigType, str], Any]
 
 
 class SchedulingClientCallback:
@@ -23,6 +32,15 @@ class SchedulingClientCallback:
         """
         ...
 
+    def on_progress(self, identifier: str, config: ConfigType, record: Any) -> None:
+        """
+        Fired when a generator consumer yields a progress record.
+        :param identifier: The identifier of the config.
+        :param config: The config object.
+        :param record: The record yielded by the consumer.
+        """
+        ...
+
     def on_config_completed(self, identifier: str, config: ConfigType) -> None:
         """
             Fired when a config file was consumed returning None.
@@ -64,6 +82,27 @@ class SchedulingClientCallback:
         """
         ...
 
+    def on_failed_to_write_profile(self, identifier: str, config: ConfigType,
+                                   exception: Exception) -> None:
+        """
+        Fired when an exception occurs while writing the profiling results of a config run.
+        :param identifier: The identifier of the config.
+        :param config: The config object.
+        :param exception: The exception caught while writing.
+        """
+        ...
+
+    def on_failed_to_write_progress(self, identifier: str, config: ConfigType,
+                                    exception: Exception) -> None:
+        """
+        Fired when an exception occurs while writing progress records of a config run. No more
+        records of this run are written, but ``on_progress`` is still fired for them.
+        :param identifier: The identifier of the config.
+        :param config: The config object.
+        :param exception: The exception caught while writing.
+        """
+        ...
+
     def on_unregistered_config(self, identifier: str, config: ConfigType) -> None:
         """
         Fired when a config was found that has no registered consumer.
@@ -103,6 +142,9 @@ class DefaultSchedulingClientCallback(SchedulingClientCallback):
     def on_config_loaded(self, identifier: str, config: ConfigType) -> None:
         print("loaded config:", config)
 
+    def on_progress(self, identifier: str, config: ConfigType, record: Any) -> None:
+        print("progress of", identifier, ":", record)
+
     def on_config_completed(self, identifier: str, config: ConfigType) -> None:
         print("completed config:", identifier)
 
@@ -117,6 +159,14 @@ class DefaultSchedulingClientCallback(SchedulingClientCallback):
                                 exception: Exception) -> None:
         print("Failed run because of", type(exception), exception)
 
+    def on_failed_to_write_profile(self, identifier: str, config: ConfigType,
+                                   exception: Exception) -> None:
+        print("Failed to write profile because of", type(exception), exception)
+
+    def on_failed_to_write_progress(self, identifier: str, config: ConfigType,
+                                    exception: Exception) -> None:
+        print("Failed to write progress because of", type(exception), exception)
+
     def on_unregistered_config(self, identifier: str, config: ConfigType) -> None:
         print("can't do anything with", identifier)
 
@@ -140,26 +190,80 @@ class SchedulingClient:
 
     def __init__(self,
                  directory_adapter: DirectoryAdapter,
-                 min_polling_interval: int = 10,
+                 min_polling_interval: float = 10,
                  timeout: Optional[int] = None,
-                 callback: Optional[SchedulingClientCallback] = DefaultSchedulingClientCallback()):
+                 callback: Optional[SchedulingClientCallback] = DefaultSchedulingClientCallback(),
+                 profiling: Optional[ProfilingOptions] = None,
+                 progress_buffer_size: int = 64 * 1024,
+                 progress_flush_interval: float = 10.,
+                 worker_id: Optional[str] = None,
+                 heartbeat_interval: Optional[float] = 30.,
+                 lease_timeout: float = 120.,
+                 submitter_field: Optional[str] = None,
+                 submitter_weights: Optional[Dict[Any, float]] = None,
+                 run_record_log: Optional[RunRecordLog] = None):
         """
         Creates a new SchedulingClient with the given directory_adapter. It will poll the planned
         directory at most every ``min_polling_interval`` seconds.
         :param directory_adapter: A subclass of DirectoryAdapter.
         :param min_polling_interval: Minimum number of seconds between polling attempts.
+        :param profiling: If given, consumer runs are profiled according to these options, unless
+        overridden for a config class in ``register_config`` (defaults to no profiling). Runs are
+        never profiled if the directory adapter does not support artifacts.
+        :param progress_buffer_size: Maximum number of bytes of progress records that are buffered
+        before they are written.
+        :param progress_flush_interval: Maximum number of seconds progress records are buffered
+        before they are written.
+        :param worker_id: A unique name of this client that is recorded in the leases of the
+        configs it runs (defaults to a random name containing host and process id).
+        :param heartbeat_interval: Number of seconds between two refreshes of the lease of the
+        running config. If None or if the adapter does not support metadata, no leases are
+        written, so configs run by this client do not count towards the ``max_active`` limits of
+        any client sharing the directory.
+        :param lease_timeout: Number of seconds after the last heartbeat after which the owner of
+        an active config is considered dead when resuming active configs.
+        :param submitter_field: The name of an attribute of the configs that identifies who
+        submitted them. If given, configs of the same class are dispatched with fair share across
+        submitters.
+        :param submitter_weights: The fair-share weight of each submitter (defaults to 1).
+        :param run_record_log: If given, a ``RunRecord`` with the timings of every run is appended
+        to this log. The records can be replayed with ``simulation.simulate``.
         """
 
         self.directory = directory_adapter
         self.min_polling_interval = min_polling_interval
         self.timeout = timeout
         self.callback = SchedulingClientCallback() if callback is None else callback
+        self.profiling = profiling
+        self.progress_buffer_size = progress_buffer_size
+        self.progress_flush_interval = progress_flush_interval
+        self.worker_id = worker_id if worker_id is not None \
+            else f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_timeout = lease_timeout
 
         self.config_consumers: Dict[Type, ConsumerCallbackType] = dict()
+        self.profiling_overrides: Dict[Type, Optional[ProfilingOptions]] = dict()
+        self.checkpointing_classes: Set[Type] = set()
+        self.max_active: Dict[Type, int] = dict()
+        self.queue = FairShareQueue(submitter_field=submitter_field,
+                                    submitter_weights=submitter_weights)
+        self.run_record_log = run_record_log
+
+        # arrival and parse time of queued configs, needed for their run records
+        self._queued_timings: Dict[str, Tuple[float, float]] = dict()
+
+        # the simulator replaces these with a virtual clock
+        self._time: Callable[[], float] = time
+        self._sleep: Callable[[float], None] = sleep
 
     def register_config(self,
                         config_class: Type,
-                        consumer_fn: ConsumerCallbackType):
+                        consumer_fn: ConsumerCallbackType,
+                        profiling: Optional[ProfilingOptions] = None,
+                        checkpointing: bool = False,
+                        weight: float = 1.,
+                        max_active: Optional[int] = None):
         """
         Registers a consumer for a given type of config. The config has to be defined by a config class
         decorated with @config.trainingconfig. The yaml decoder will then look for a config file with
@@ -167,15 +271,137 @@ class SchedulingClient:
         with this tag is found, the given ``consumer_fn`` will be called, passing the config as the
         first parameter. The return value of ``consumer_fn`` will be parsed with ``json.dump`` and saved
         alongside the config file in the ``completed_runs`` directory.
+        If ``consumer_fn`` is a generator function, every yielded object is treated as a
+        json-serializable progress record. Records are passed to ``on_progress`` of the callback
+        and, if the adapter supports progress, written incrementally via
+        ``DirectoryAdapter.write_progress``. Once the config is finished, its progress is moved
+        next to it as ``[identifier].progress.jsonl``. The value returned by the generator is
+        treated like the return value of a regular consumer.
         :param config_class: The class to be consumed by ``consumer_fn``.
         :param consumer_fn: A function that consumes configs of type ``config_class`` and possibly returns
         a json-serializable result object.
+        :param profiling: If given, these options override the ``profiling`` options of the client
+        for configs of type ``config_class``. Pass ``ProfilingOptions(sampling_rate=0)`` to disable
+        profiling for this class.
+        :param checkpointing: If true, ``consumer_fn`` is called with a ``Checkpoint`` handle as
+        third parameter. It can be used to record checkpoints and, if the config is resumed, to
+        continue from the last recorded checkpoint (defaults to false). This requires an adapter
+        that supports metadata.
+        :param weight: The fair-share weight of ``config_class``. Planned configs of all
+        registered classes are dispatched interleaved, proportionally to their weights.
+        :param max_active: If given, configs of ``config_class`` are only dispatched while less
+        than ``max_active`` of them are running on all workers sharing the directory. Running
+        configs are counted by their live leases, so only workers with a ``heartbeat_interval``
+        are taken into account.
         """
 
         if config_class in self.config_consumers:
             raise Exception(f"There already is a consumer for {config_class}.")
+        if checkpointing and not self.directory.supports_metadata:
+            raise ValueError("Checkpointing requires metadata, which "
+                             f"{type(self.directory).__name__} does not support.")
+        if weight <= 0:
+            raise ValueError(f"The weight of {config_class} must be positive.")
 
         self.config_consumers[config_class] = consumer_fn
+        if profiling is not None:
+            self.profiling_overrides[config_class] = profiling
+        if checkpointing:
+            self.checkpointing_classes.add(config_class)
+        self.queue.class_weights[config_class] = weight
+        if max_active is not None:
+            self.max_active[config_class] = max_active
+
+    def _consume(self, identifier: str, config: ConfigType) -> Any:
+        """
+        Runs the consumer registered for ``config`` and returns its result. Progress records of
+        generator consumers are streamed to the directory adapter while the consumer runs.
+        """
+        lease_keeper = LeaseKeeper(self.directory, identifier, self.worker_id,
+                                   self.heartbeat_interval, type(config).__name__) \
+            if self.heartbeat_interval is not None and self.directory.supports_metadata \
+            else nullcontext()
+
+        with lease_keeper:
+            consumer_fn = self.config_consumers[type(config)]
+            if type(config) in self.checkpointing_classes:
+                result = consumer_fn(config, identifier,  # type: ignore
+                                     Checkpoint(self.directory, identifier))
+            else:
+                result = consumer_fn(config, identifier)
+
+            if not inspect.isgenerator(result):
+                return result
+
+            generator = result
+            def on_error(e: Exception) -> None:
+                self.callback.on_failed_to_write_progress(identifier, config, e)
+
+            with ProgressWriter(self.directory, identifier, self.progress_buffer_size,
+                                self.progress_flush_interval, on_error) as writer:
+                while True:
+                    try:
+                        record = next(generator)
+                    except StopIteration as stop:
+                        return stop.value
+                    self.callback.on_progress(identifier, config, record)
+                    writer.write(record)
+
+    def _create_profiler(self, config_class: Type) -> Optional[ConsumerProfiler]:
+        """
+        Returns a profiler for the next run of a config of type ``config_class`` or None if this
+        run should not be profiled.
+        """
+        if not self.directory.supports_artifacts:
+            # there would be nowhere to write the results
+            return None
+        options = self.profiling_overrides.get(config_class, self.profiling)
+        if options is not None and options.should_profile():
+            return ConsumerProfiler(options)
+        return None
+
+    def _write_profile(self, identifier: str, config: ConfigType,
+                       profiler: ConsumerProfiler, debug: bool) -> None:
+        """
+        Writes the results of ``profiler`` next to the config via the directory adapter.
+        """
+        try:
+            for suffix, data in profiler.get_artifacts().items():
+                self.directory.write_artifact(identifier, suffix, data)
+        except Exception as e:
+            self.callback.on_failed_to_write_profile(identifier, config, e)
+            if debug: raise
+
+    def _archive_progress(self, identifier: str, config: ConfigType, debug: bool) -> None:
+        """
+        Moves the progress of a finished config next to it, so a config that is planned again
+        with the same identifier starts without progress.
+        """
+        try:
+            self.directory.archive_progress(identifier)
+        except Exception as e:
+            self.callback.on_failed_to_write_progress(identifier, config, e)
+            if debug: raise
+
+    def _delete_metadata(self, identifier: str) -> None:
+        """
+        Deletes the checkpoint and lease of a finished config, so a config that is planned again
+        with the same identifier starts from scratch.
+        """
+        for name in (Checkpoint.name, Lease.name):
+            try:
+                self.directory.delete_metadata(identifier, name)
+            except Exception:
+                # leftover metadata only takes up space, it is not worth failing the run for
+                pass
+
+    def _is_owned_by_live_worker(self, identifier: str) -> bool:
+        """
+        Checks if the active config with the given ``identifier`` is still run by another worker.
+        """
+        lease = Lease.read(self.directory, identifier)
+        return lease is not None and lease.worker_id != self.worker_id \
+            and lease.is_alive(self.lease_timeout)
 
     def _resume_active_configs(self):
         # check for active configs
@@ -187,13 +413,107 @@ class SchedulingClient:
                   else f"are {len(active_configs)} configs",
                   "marked as active:")
 
+            resumable_configs = []
             for identifier in active_configs:
-                print(" -", identifier)
-                self.directory.change_state(identifier, ConfigState.planned,
-                                            validate_change=False)
+                if self._is_owned_by_live_worker(identifier):
+                    print(" -", identifier, "(still running on another worker, skipped)")
+                else:
+                    print(" -", identifier)
+                    resumable_configs.append(identifier)
+
+            if len(resumable_configs) > 0:
+                resumed_configs = self.directory.change_states(
+                    resumable_configs, ConfigState.planned, validate_change=False)
+
+                if len(resumed_configs) == len(resumable_configs):
+                    print("It was" if len(resumed_configs) == 1 else "They were",
+                          "moved back into the planned directory to be resumed.")
+                else:
+                    print(len(resumed_configs), "of them were moved back into the planned",
+                          "directory to be resumed, the others were moved by another worker.")
+
+    def _run_config(self, identifier: str, config: ConfigType, debug: bool) -> None:
+        """
+        Runs the consumer for ``config`` and moves the config into the completed or failed state
+        depending on the result.
+        """
+
+        # move config to active folder
+        if self.directory.identifier_states.get(identifier) != ConfigState.planned:
+            # a poll found the config in another state, another client was faster
+            self._queued_timings.pop(identifier, None)
+            return
+        try:
+            self.directory.change_state(identifier, ConfigState.active)
+        except ConfigNotFoundError:
+            # another client was faster
+            self._queued_timings.pop(identifier, None)
+            return
+
+        # run consumer
+
+        profiler = self._create_profiler(type(config))
+        time_of_start = self._time()
+
+        try:
+            with profiler if profiler is not None else nullcontext():
+                result = self._consume(identifier, config)
+        except Exception as e:
+            self.callback.on_failed_to_run_config(identifier, config, e)
+            if debug: raise
+            result = f"Failed to run config due to {e}."
+
+        run_duration = self._time() - time_of_start
+
+        # bookkeeping and possible write of result
+
+        if result is None:  # implies consuming ran as expected
+            self.directory.change_state(identifier, ConfigState.completed)
+            self.callback.on_config_completed(identifier, config)
+        else:  # something went wrong
+            self.directory.change_state(identifier, ConfigState.failed)
+            self.callback.on_config_failed(identifier, config, result)
+            try:
+                if result is not None:
+                    self.directory.write_output(identifier, json.dumps(result))
+            except Exception as e:
+                self.callback.on_failed_to_write_result(identifier, config,
+                                                        result, e)
+                if debug: raise
+
+        if self.directory.supports_metadata:
+            self._delete_metadata(identifier)
+        if self.directory.supports_progress:
+            self._archive_progress(identifier, config, debug)
+
+        if profiler is not None:
+            self._write_profile(identifier, config, profiler, debug)
+
+        arrival, parse_time = self._queued_timings.pop(identifier, (time_of_start, 0.))
+        if self.run_record_log is not None:
+            submitter_field = self.queue.submitter_field
+            self.run_record_log.append(RunRecord(
+                identifier, type(config).__name__, arrival, parse_time, time_of_start,
+                run_duration, "completed" if result is None else "failed",
+                getattr(config, submitter_field, None) if submitter_field else None))
+
+    def _get_dispatch_filter(self) -> Callable[[Type], bool]:
+        """
+        Returns a function that checks if a config class may be dispatched with respect to its
+        ``max_active`` limit. The number of running configs of each class is determined from the
+        live leases of all active configs.
+        """
+        if not self.max_active:
+            return lambda config_class: True
+
+        active_counts: Counter = Counter()
+        for identifier in self.directory.poll_directory(ConfigState.active):
+            lease = Lease.read(self.directory, identifier)
+            if lease is not None and lease.is_alive(self.lease_timeout):
+                active_counts[lease.config_class] += 1
 
-            print("It was" if len(active_configs) == 1 else "They were", "moved back into the",
-                  "planned directory to be resumed.")
+        return lambda config_class: config_class not in self.max_active or \
+            active_counts[config_class.__name__] < self.max_active[config_class]
 
     def run(self, debug=False, resume_active_configs=False) -> None:
         """
@@ -214,62 +534,56 @@ class SchedulingClient:
             # poll directory for new config files
             identifiers = self.directory.poll()
 
-            time_of_last_poll = time()
+            time_of_last_poll = self._time()
 
             if len(identifiers) > 0:
-                time_of_last_nonempty_poll = time_of_last_poll
+                # configs that are only waiting for their class limit don't count as found
+                if any(identifier not in self.queue for identifier in identifiers):
+                    time_of_last_nonempty_poll = time_of_last_poll
 
                 # check if there are actually executable configurations
                 for identifier in identifiers:
+                    if identifier in self.queue:
+                        continue
 
                     # read config
-                    config = self.directory.get_config(identifier)
+                    time_of_parse_start = self._time()
+                    try:
+                        config = self.directory.get_config(identifier)
+                    except ConfigNotFoundError:
+                        # another client claimed the config since we polled
+                        continue
+                    parse_time = self._time() - time_of_parse_start
 
                     self.callback.on_config_loaded(identifier, config)
 
                     # check if there is a consumer for this config
                     if config and type(config) in self.config_consumers:
-
-                        # move config to active folder
-                        self.directory.change_state(identifier, ConfigState.active)
-
-                        # run consumer
-
-                        try:
-                            result = self.config_consumers[type(config)](config, identifier)
-                        except Exception as e:
-                            self.callback.on_failed_to_run_config(identifier, config, e)
-                            if debug: raise
-                            result = f"Failed to run config due to {e}."
-
-                        # bookkeeping and possible write of result
-
-                        if result is None:  # implies consuming ran as expected
-                            self.directory.change_state(identifier, ConfigState.completed)
-                            self.callback.on_config_completed(identifier, config)
-                        else:  # something went wrong
-                            self.directory.change_state(identifier, ConfigState.failed)
-                            self.callback.on_config_failed(identifier, config, result)
-                            try:
-                                if result is not None:
-                                    self.directory.write_output(identifier, json.dumps(result))
-                            except Exception as e:
-                                self.callback.on_failed_to_write_result(identifier, config,
-                                                                        result, e)
-                                if debug: raise
-
+                        self.queue.push(identifier, config)
+                        self._queued_timings[identifier] = (time_of_last_poll, parse_time)
                     else:  # no consumer registered
                         self.callback.on_unregistered_config(identifier, config)
+
+                # run queued configs in fair-share order until it is time to poll again, so
+                # that newly planned configs can get their share
+                while True:
+                    entry = self.queue.pop(self._get_dispatch_filter())
+                    if entry is None:
+                        break
+                    self._run_config(*entry, debug=debug)
+                    time_of_last_nonempty_poll = time_of_last_poll
+                    if self._time() - time_of_last_poll >= self.min_polling_interval:
+                        break
             else:
                 self.callback.on_no_configs_found()
 
             # check if we should abort
-            if self.timeout and time() - time_of_last_nonempty_poll > self.timeout:
+            if self.timeout and self._time() - time_of_last_nonempty_poll > self.timeout:
                 self.callback.on_timeout()
                 return
 
             # check if we should poll again
-            time_delta = self.min_polling_interval - (time() - time_of_last_poll)
+            time_delta = self.min_polling_interval - (self._time() - time_of_last_poll)
             if time_delta > 0:
                 self.callback.on_waiting_for_next_poll(time_delta)
-                sleep(time_delta)
+                self._sleep(time_delta)
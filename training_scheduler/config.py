@@ -1,81 +1,72 @@
-from typing import Any, Iterable, Type, Tuple, Dict
-from yamlable import YamlCodec
+import sys
+from typing import Any, Type, Dict, IO, Optional, Union
 
+# The classes decorated with ``trainingconfig``. If PyYaml has not been imported yet, decorating a
+# class only records it here, PyYaml and yamlable are then imported and set up once when the first
+# config is loaded or dumped (see ``get_codec``).
+_types_to_yaml_tags: Dict[Type, str] = dict()
+_yaml_tags_to_types: Dict[str, Type] = dict()
 
-class ConfigCodec(YamlCodec):
-    """A YamlCodec that registers all custom config classes as yamlable. See the yamlable documentation for details."""
-    types_to_yaml_tags: Dict[Type, str] = dict()
-    yaml_tags_to_types: Dict[str, Type] = dict()
 
-    @classmethod
-    def register_type(cls, typ, tag):
-        """
-        Register a class ``typ`` as yamlable with the given ``tag``. PyYaml will then look for tags in the yaml
-        containing the tag ``!trainingconfig/[tag]`` and parse it into the given ``typ``. Instead of registering via
-        this function, you can use the ``trainingconfig`` decorator.
-        :param typ: The class that the yaml will be parsed into.
-        :param tag: The tag that will be associated with the given class.
-        """
-        cls.types_to_yaml_tags[typ] = tag
-        cls.yaml_tags_to_types[tag] = typ
-
-    @classmethod
-    def get_yaml_prefix(cls):
-        """
-        Returns the tag prefix ``!trainingconfig/``.
-        :return: The prefix for all training config tags.
-        """
-        return "!trainingconfig/"  # This is our root yaml tag
+def get_codec() -> Type:
+    """
+    Returns the ``ConfigCodec`` that makes all config classes yamlable. On the first call, PyYaml
+    and yamlable are imported and the codec is registered with PyYaml.
+    :return: The ``ConfigCodec`` class.
+    """
+    from ._codec import ConfigCodec
+    return ConfigCodec
 
-    # ----
 
-    @classmethod
-    def get_known_types(cls) -> Iterable[Type[Any]]:
-        """
-        :return: the list of types that we know how to encode
-        """
-        return cls.types_to_yaml_tags.keys()
+def __getattr__(name: str) -> Any:
+    # ``ConfigCodec`` used to be defined in this module, keep it importable from here
+    if name == "ConfigCodec":
+        return get_codec()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    @classmethod
-    def is_yaml_tag_supported(cls, yaml_tag_suffix: str) -> bool:
-        """
-        :param yaml_tag_suffix: The tag to check.
-        :return: True if the given yaml tag suffix is supported
-        """
-        return yaml_tag_suffix in cls.yaml_tags_to_types.keys()
 
-    # ----
+def load_config(stream: Union[str, bytes, IO]) -> Any:
+    """
+    Parses a config from the given yaml ``stream``. All classes decorated with ``trainingconfig``
+    are known to the parser.
+    :param stream: The yaml as a string, bytes or file object.
+    :return: An instance of the class associated with the yaml tag of the config.
+    """
+    get_codec()
+    import yaml
+    return yaml.safe_load(stream)
 
-    @classmethod
-    def from_yaml_dict(cls, yaml_tag_suffix: str, dct, **kwargs):
-        """
-        Create an object corresponding to the given tag, from the decoded dict.
-        :param yaml_tag_suffix: The given tag.
-        :param dct: The dictionary to populate the associated class instance with.
-        :return: An instance of the class associated with the given tag, containing data from ``dct``.
-        """
-        typ = cls.yaml_tags_to_types[yaml_tag_suffix]
-        return typ(**dct)
 
-    @classmethod
-    def to_yaml_dict(cls, obj) -> Tuple[str, Any]:
-        """
-        Encode the given object and also return the tag that it should have
-        :param obj: The object to encode.
-        :return: A tuple ``(tag, dct)`` containing the ``tag`` associated with the type of the given object and a dictionary
-        ``dct`` that can be parsed into a yaml.
-        """
-        return cls.types_to_yaml_tags[type(obj)], vars(obj)
+def _yaml_error() -> Type[Exception]:
+    # PyYaml is imported lazily, so its exceptions can't be referenced at import time
+    import yaml
+    return yaml.YAMLError
 
 
-ConfigCodec.register_with_pyyaml()
+def dump_config(config: Any, stream: Optional[IO] = None) -> Optional[str]:
+    """
+    Dumps ``config`` as yaml with the tag of its class. Unlike plain ``yaml.dump``, this also works
+    before PyYaml has been imported.
+    :param config: An instance of a class decorated with ``trainingconfig``.
+    :param stream: A file object to write the yaml to. If None, the yaml is returned.
+    :return: The yaml as a string if no ``stream`` is given, None otherwise.
+    """
+    get_codec()
+    import yaml
+    return yaml.dump(config, stream)
 
 
 def trainingconfig(cls: type):
     """
     A decorator that registers the decorated class in yamlable, so that PyYaml automatically parses it into an instance
     of the decorated class. The corresponding yaml tag will be ``!trainingconfig/[classname]``.
+    If PyYaml has already been imported, the class is registered right away, so plain
+    ``yaml.dump`` and ``yaml.safe_load`` work with it. Otherwise, registration is deferred until
+    the first call of ``load_config`` or ``dump_config``.
     """
-    ConfigCodec.register_type(cls, cls.__name__)
-    ConfigCodec.register_with_pyyaml()
+    if "yaml" in sys.modules or __package__ + "._codec" in sys.modules:
+        get_codec().register_type(cls, cls.__name__)
+    else:
+        _types_to_yaml_tags[cls] = cls.__name__
+        _yaml_tags_to_types[cls.__name__] = cls
     return cls
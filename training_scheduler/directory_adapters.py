@@ -1,9 +1,10 @@
 import os
+import threading
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import List, Union, Dict, Any
+from typing import List, Union, Dict, Any, Optional
 
-import yaml
+from .config import load_config, _yaml_error
 
 ConfigState = Enum("ConfigState", "planned active completed failed")
 ConfigType = Any
@@ -12,13 +13,31 @@ _allowed_state_changes = ((ConfigState.planned, ConfigState.active),
                           (ConfigState.active, ConfigState.failed))
 
 
+class ConfigNotFoundError(Exception):
+    """
+    Raised by a directory adapter when a config is not in the state it was expected in, e.g.
+    because another client moved it in the meantime.
+    """
+    pass
+
+
 class DirectoryAdapter(ABC):
     """
     Abstract base class for all directory adapters. Every directory adapter must implement
     polling of new planned configurations, moving them into the active / completed state and
     provide means to add output data to the completed configurations.
+    Optional features are declared with the ``supports_*`` flags below. The methods of a feature
+    are only called if its flag is true, so adapters without it do not need to override them.
     """
 
+    supports_artifacts: bool = False
+    """If true, the adapter implements ``write_artifact``."""
+    supports_progress: bool = False
+    """If true, the adapter implements ``write_progress`` and ``archive_progress``."""
+    supports_metadata: bool = False
+    """If true, the adapter implements ``write_metadata``, ``read_metadata`` and
+    ``delete_metadata``."""
+
     def __init__(self):
         self.identifier_states: Dict[str, ConfigState] = dict()
 
@@ -35,6 +54,19 @@ class DirectoryAdapter(ABC):
         else:
             raise Exception(f"Tried to register identifier '{identifier}' that is already present.")
 
+    def _record_listing(self, identifiers: List[str], state: ConfigState) -> List[str]:
+        """
+        Records that the configs with the given ``identifiers`` were found in ``state``. The
+        directory is the source of truth, so configs that other clients moved since they were
+        last seen are recorded in their new state.
+
+        :param identifiers: The identifiers of all configs found in ``state``.
+        :return: ``identifiers``.
+        """
+        for identifier in identifiers:
+            self.identifier_states[identifier] = state
+        return identifiers
+
     def change_state(self, identifier: str, next_state: ConfigState,
                      validate_change: bool = True) -> None:
         """
@@ -51,22 +83,76 @@ class DirectoryAdapter(ABC):
         if validate_change and (old_state, next_state) not in _allowed_state_changes:
             raise ValueError(f"{old_state} -> {next_state} is not a valid state change.")
 
-        self._move_to_state(identifier, self.identifier_states[identifier], next_state)
+        try:
+            self._move_to_state(identifier, self.identifier_states[identifier], next_state)
+        except ConfigNotFoundError:
+            # forget the identifier, the next poll will find it where it is now
+            del self.identifier_states[identifier]
+            raise
         self.identifier_states[identifier] = next_state
 
+    def change_states(self, identifiers: List[str], next_state: ConfigState,
+                      validate_change: bool = True) -> List[str]:
+        """
+        Changes the state of all configs with the given ``identifiers`` to ``next_state``. Adapters
+        may execute the changes in a batch, which is cheaper than calling ``change_state`` for each
+        identifier. Configs that are not in their expected state anymore are skipped, like
+        ``change_state`` does when it raises a ``ConfigNotFoundError``.
+
+        :param identifiers: The identifiers of the configs.
+        :param next_state: The next state.
+        :param validate_change: If ``True`` (default), the method will check if the state changes
+        are allowed (see ``change_state``).
+        :return: The identifiers of the configs that were moved.
+        """
+        old_states = [self.identifier_states[i] for i in identifiers]
+
+        if validate_change:
+            for old_state in old_states:
+                if (old_state, next_state) not in _allowed_state_changes:
+                    raise ValueError(f"{old_state} -> {next_state} is not a valid state change.")
+
+        moved = self._move_many_to_state(identifiers, old_states, next_state)
+        moved_set = set(moved)
+        for identifier in identifiers:
+            if identifier in moved_set:
+                self.identifier_states[identifier] = next_state
+            else:
+                # forget the identifier, the next poll will find it where it is now
+                del self.identifier_states[identifier]
+        return moved
+
     @abstractmethod
     def _move_to_state(self, identifier: str, old_state: ConfigState, new_state: ConfigState):
         """
         Method called by the abstract class to execute a state change. It has already been
-        validated.
+        validated. Raises a ``ConfigNotFoundError`` if the config is not in ``old_state``.
         """
         pass
 
+    def _move_many_to_state(self, identifiers: List[str], old_states: List[ConfigState],
+                            new_state: ConfigState) -> List[str]:
+        """
+        Method called by the abstract class to execute several validated state changes. By
+        default, ``_move_to_state`` is called for every identifier. Returns the identifiers of
+        the configs that were moved, skipping those that are not in their old state.
+        """
+        moved = []
+        for identifier, old_state in zip(identifiers, old_states):
+            try:
+                self._move_to_state(identifier, old_state, new_state)
+            except ConfigNotFoundError:
+                continue
+            moved.append(identifier)
+        return moved
+
     @abstractmethod
     def poll_directory(self, state: ConfigState) -> List[str]:
         """
         Check the directory associated with the given ``state`` for valid configs and return their
-        unique identifier.
+        unique identifier. The result reflects the directory itself, including configs that other
+        clients sharing it moved into ``state``. Implementations record the result with
+        ``_record_listing``.
         :param state: The state from which valid configs shall be returned.
         :return: A list of identifiers of configs found.
         """
@@ -100,6 +186,70 @@ class DirectoryAdapter(ABC):
         """
         pass
 
+    def write_artifact(self, identifier: str, suffix: str, data: bytes) -> None:
+        """
+        Stores ``data`` next to the config with the given ``identifier`` under the name
+        ``[identifier][suffix]``, e.g. profiling results.
+
+        :param identifier: The unique identifier to write the artifact for.
+        :param suffix: The suffix appended to the identifier to name the artifact.
+        :param data: The content of the artifact.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support writing artifacts.")
+
+    def write_progress(self, identifier: str, records: str) -> None:
+        """
+        Appends a chunk of newline-delimited progress records to the progress of the config with
+        the given ``identifier``. The progress is kept in a place that does not depend on the
+        state of the config.
+
+        :param identifier: The unique identifier to write progress for.
+        :param records: Newline-delimited json records.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support writing progress.")
+
+    def archive_progress(self, identifier: str) -> None:
+        """
+        Moves the progress of the finished config with the given ``identifier`` next to the
+        config as ``[identifier].progress.jsonl``, so a config that is planned again with the same
+        identifier starts without progress. Does nothing if no progress was written.
+
+        :param identifier: The unique identifier of the finished config.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support writing progress.")
+
+    def write_metadata(self, identifier: str, name: str, data: str) -> None:
+        """
+        Replaces the metadata ``name`` of the config with the given ``identifier`` with ``data``,
+        e.g. checkpoints. Like progress, metadata does not depend on the state of the config. The
+        write should be atomic, so a crash can't leave partially written metadata behind.
+
+        :param identifier: The unique identifier to write metadata for.
+        :param name: The name of the metadata.
+        :param data: The content of the metadata.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support metadata.")
+
+    def read_metadata(self, identifier: str, name: str) -> Optional[str]:
+        """
+        Reads the metadata ``name`` of the config with the given ``identifier``.
+
+        :param identifier: The unique identifier to read metadata for.
+        :param name: The name of the metadata.
+        :return: The content of the metadata or None if it was never written.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support metadata.")
+
+    def delete_metadata(self, identifier: str, name: str) -> None:
+        """
+        Deletes the metadata ``name`` of the config with the given ``identifier``. Deleting
+        metadata that does not exist is not an error.
+
+        :param identifier: The unique identifier to delete metadata for.
+        :param name: The name of the metadata.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support metadata.")
+
 
 def _move_to_dir(file: Union[os.PathLike, str], dir: Union[os.PathLike, str]) -> None:
     """
@@ -118,6 +268,10 @@ class LocalDirectoryAdapter(DirectoryAdapter):
     A DirectoryAdapter that manages configs in separate directories in the local file system.
     """
 
+    supports_artifacts = True
+    supports_progress = True
+    supports_metadata = True
+
     def __init__(self, base_dir: Union[str, os.PathLike]):
         """
         Create an adapter that creates several subdirectories in the given ``base_dir``.
@@ -131,31 +285,76 @@ class LocalDirectoryAdapter(DirectoryAdapter):
         for state in ConfigState:
             self.directories[state] = os.path.join(self.base_dir, state.name)
             os.makedirs(self.directories[state], exist_ok=True)
+        self.progress_dir = os.path.join(self.base_dir, "progress")
+        self.metadata_dir = os.path.join(self.base_dir, "metadata")
 
     def poll_directory(self, state: ConfigState) -> List[str]:
         with os.scandir(self.directories[state]) as it:
-            for de in it:
-                if de.path.endswith('.yaml') and de.is_file():
-                    identifier = os.path.basename(de.path)
-                    if identifier not in self.identifier_states:
-                        self._add_identifier(identifier, state)
-        return [i for i, s in self.identifier_states.items() if s == state]
+            identifiers = [os.path.basename(de.path) for de in it
+                           if de.path.endswith('.yaml') and de.is_file()]
+        return self._record_listing(identifiers, state)
 
     def get_config(self, identifier: str):
         with open(os.path.join(self.directories[ConfigState.planned], identifier)) as file:
             try:
-                config = yaml.safe_load(file)
+                config = load_config(file)
                 return config
-            except TypeError as e:
+            except (TypeError, _yaml_error()) as e:
                 # TODO move prints to a more controllable place, so user can change it
                 print("There is an issue with the config", identifier)
                 print(e)
 
     def _move_to_state(self, identifier: str, old_state: ConfigState, new_state: ConfigState):
-        _move_to_dir(os.path.join(self.directories[old_state], identifier),
-                     self.directories[new_state])
+        try:
+            _move_to_dir(os.path.join(self.directories[old_state], identifier),
+                         self.directories[new_state])
+        except FileNotFoundError as e:
+            raise ConfigNotFoundError(identifier) from e
 
     def write_output(self, identifier: str, output: str) -> None:
         with open(os.path.join(self.directories[ConfigState.failed],
                                identifier + ".out"), 'a') as file:
             file.write(output)
+
+    def write_artifact(self, identifier: str, suffix: str, data: bytes) -> None:
+        state = self.identifier_states[identifier]
+        with open(os.path.join(self.directories[state], identifier + suffix), 'wb') as file:
+            file.write(data)
+
+    def write_progress(self, identifier: str, records: str) -> None:
+        os.makedirs(self.progress_dir, exist_ok=True)
+        with open(os.path.join(self.progress_dir, identifier + ".jsonl"), 'a') as file:
+            file.write(records)
+
+    def archive_progress(self, identifier: str) -> None:
+        state = self.identifier_states[identifier]
+        try:
+            os.replace(os.path.join(self.progress_dir, identifier + ".jsonl"),
+                       os.path.join(self.directories[state], identifier + ".progress.jsonl"))
+        except FileNotFoundError:
+            pass
+
+    def _metadata_path(self, identifier: str, name: str) -> str:
+        return os.path.join(self.metadata_dir, f"{identifier}.{name}.json")
+
+    def write_metadata(self, identifier: str, name: str, data: str) -> None:
+        os.makedirs(self.metadata_dir, exist_ok=True)
+        path = self._metadata_path(identifier, name)
+        # write to a temporary file first so the replacement is atomic
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def read_metadata(self, identifier: str, name: str) -> Optional[str]:
+        try:
+            with open(self._metadata_path(identifier, name)) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def delete_metadata(self, identifier: str, name: str) -> None:
+        try:
+            os.remove(self._metadata_path(identifier, name))
+        except FileNotFoundError:
+            pass
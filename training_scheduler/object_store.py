@@ -0,0 +1,423 @@
+import base64
+import hashlib
+import hmac
+import http.client
+import queue
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator, Union
+from urllib.parse import urlsplit, quote
+
+from .config import load_config, _yaml_error
+from .directory_adapters import DirectoryAdapter, ConfigState, ConfigType, ConfigNotFoundError
+
+_Connection = Union[http.client.HTTPConnection, http.client.HTTPSConnection]
+
+# errors that indicate that a pooled keep-alive connection was closed by the server
+_stale_connection_errors = (http.client.RemoteDisconnected, ConnectionResetError,
+                            BrokenPipeError, http.client.CannotSendRequest)
+
+
+class ObjectStoreError(Exception):
+    """Raised when the object store answers a request with an unexpected status."""
+
+    def __init__(self, method: str, path: str, status: int, body: bytes):
+        super(ObjectStoreError, self).__init__(
+            f"{method} {path} failed with status {status}: {body[:200]!r}")
+        self.status = status
+
+
+class _ConnectionPool:
+    """
+    A fixed-size pool of keep-alive HTTP connections to a single host. Connections are created
+    lazily and reused for subsequent requests.
+    """
+
+    def __init__(self, endpoint_url: str, max_connections: int, timeout: float):
+        """
+        Create a pool for the host in ``endpoint_url``.
+        :param endpoint_url: The url of the host, e.g. ``http://localhost:9000``.
+        :param max_connections: The maximum number of simultaneously open connections.
+        :param timeout: The socket timeout for each connection in seconds.
+        """
+        url = urlsplit(endpoint_url)
+        self.host = url.netloc
+        self.timeout = timeout
+        self._connection_class = http.client.HTTPSConnection if url.scheme == "https" \
+            else http.client.HTTPConnection
+        self._idle: "queue.LifoQueue[Optional[_Connection]]" = queue.LifoQueue()
+        for _ in range(max_connections):
+            self._idle.put(None)
+
+    def request(self, method: str, path: str, body: bytes,
+                headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Sends a request over a pooled connection and reads the full response. A request on a
+        connection that was closed by the server in the meantime is retried once on a fresh one.
+
+        :return: A tuple ``(status, headers, body)`` of the response.
+        """
+        connection = self._idle.get()
+        try:
+            for attempt in range(2):
+                if connection is None:
+                    connection = self._connection_class(self.host, timeout=self.timeout)
+                try:
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                except _stale_connection_errors:
+                    connection.close()
+                    connection = None
+                    if attempt > 0:
+                        raise
+                    continue
+                if response.will_close:
+                    connection.close()
+                    connection = None
+                return response.status, {k.lower(): v for k, v in response.getheaders()}, data
+            raise AssertionError("unreachable")
+        except Exception:
+            if connection is not None:
+                connection.close()
+            connection = None
+            raise
+        finally:
+            self._idle.put(connection)
+
+    def close(self) -> None:
+        """
+        Closes all idle connections of this pool.
+        """
+        connections = []
+        while not self._idle.empty():
+            connections.append(self._idle.get())
+        for connection in connections:
+            if connection is not None:
+                connection.close()
+            self._idle.put(None)
+
+
+def _hmac_sha256(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+def _local_name(element: ET.Element) -> str:
+    """Returns the tag of ``element`` without its xml namespace."""
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _children(element: ET.Element, name: str) -> Iterator[ET.Element]:
+    return (child for child in element if _local_name(child) == name)
+
+
+def _child_text(element: ET.Element, name: str) -> Optional[str]:
+    for child in _children(element, name):
+        return child.text
+    return None
+
+
+class ObjectStoreDirectoryAdapter(DirectoryAdapter):
+    """
+    A DirectoryAdapter that manages configs in an S3-compatible object store. Configs of each
+    state are stored under the key prefix ``[prefix][state]/`` of the given bucket. State changes
+    are executed as a server-side copy followed by a delete. Requests are signed with AWS
+    signature version 4 if credentials are given.
+
+    Claiming a config (moving it from planned to active) is only exclusive if the store supports
+    conditional copies with ``If-None-Match: *``, which the adapter sends unless
+    ``conditional_claims`` is False. The copy then fails for all but the first of several workers
+    that claim the same config at the same time. Without that support, two workers can both copy
+    the config before either deletes it, so a config may run more than once (at-least-once
+    semantics). A conditional claim also fails while an active config with the same identifier
+    is left over from an earlier run, until that one is resumed.
+    """
+
+    supports_artifacts = True
+    supports_progress = True
+    supports_metadata = True
+
+    def __init__(self, endpoint_url: str, bucket: str, prefix: str = "",
+                 access_key: Optional[str] = None, secret_key: Optional[str] = None,
+                 region: str = "us-east-1", max_connections: int = 8,
+                 page_size: int = 1000, timeout: float = 30., conditional_claims: bool = True):
+        """
+        Create an adapter for the configs stored in ``bucket``.
+        :param endpoint_url: The url of the object store, e.g. ``https://s3.amazonaws.com``.
+        :param bucket: The name of the bucket. It is addressed path-style.
+        :param prefix: A key prefix under which the state "directories" are placed.
+        :param access_key: Access key used for signing requests. If None, requests are unsigned.
+        :param secret_key: Secret key used for signing requests.
+        :param region: The region used for signing requests.
+        :param max_connections: Maximum number of pooled HTTP connections.
+        :param page_size: Maximum number of keys requested per listing page (at most 1000).
+        :param timeout: Socket timeout in seconds.
+        :param conditional_claims: If true (default), claims are made exclusive with a
+        conditional copy. Disable this for stores that reject ``If-None-Match`` on copies.
+        """
+        super(ObjectStoreDirectoryAdapter, self).__init__()
+        self.bucket = bucket
+        self.prefix = prefix
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.page_size = page_size
+        self.conditional_claims = conditional_claims
+        self._pool = _ConnectionPool(endpoint_url, max_connections, timeout)
+
+        # ETags of the config objects seen in the last listing of each state and parsed planned
+        # configs by ETag, both only hold configs that were still there at the last poll
+        self._listed_etags: Dict[ConfigState, Dict[str, str]] = {s: dict() for s in ConfigState}
+        self._config_cache: Dict[str, Tuple[str, ConfigType]] = dict()
+        # number of progress chunks written per identifier
+        self._progress_chunks: Dict[str, int] = dict()
+
+    # ---- low level requests
+
+    def _key(self, state: ConfigState, name: str) -> str:
+        return f"{self.prefix}{state.name}/{name}"
+
+    def _sign(self, method: str, path: str, query: str, headers: Dict[str, str],
+              payload_hash: str) -> None:
+        """
+        Adds the ``Authorization`` header of AWS signature version 4 to ``headers``.
+        """
+        assert self.access_key is not None and self.secret_key is not None
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date = amz_date[:8]
+        headers["x-amz-date"] = amz_date
+
+        signed = {k.lower(): v.strip() for k, v in headers.items()
+                  if k.lower() == "host" or k.lower().startswith("x-amz-")}
+        signed_headers = ";".join(sorted(signed))
+        canonical_headers = "".join(f"{k}:{signed[k]}\n" for k in sorted(signed))
+        canonical_query = "&".join(sorted(query.split("&"))) if query else ""
+        canonical_request = "\n".join([method, path, canonical_query, canonical_headers,
+                                       signed_headers, payload_hash])
+
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode()).hexdigest()])
+        key = _hmac_sha256(("AWS4" + self.secret_key).encode(), date)
+        for part in (self.region, "s3", "aws4_request"):
+            key = _hmac_sha256(key, part)
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        headers["Authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={signed_headers}, Signature={signature}")
+
+    def _request(self, method: str, key: str = "", query: Iterable[Tuple[str, str]] = (),
+                 body: bytes = b"", headers: Optional[Dict[str, str]] = None,
+                 expected: Tuple[int, ...] = (200,)) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Sends a request for ``key`` in the bucket of this adapter.
+
+        :param expected: Status codes that do not raise an ``ObjectStoreError``.
+        :return: A tuple ``(status, headers, body)`` of the response.
+        """
+        path = quote(f"/{self.bucket}/{key}" if key else f"/{self.bucket}", safe="/-_.~")
+        query_string = "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}"
+                                for k, v in query)
+        headers = dict(headers or {})
+        headers["Host"] = self._pool.host
+        payload_hash = hashlib.sha256(body).hexdigest()
+        headers["x-amz-content-sha256"] = payload_hash
+        if self.access_key is not None:
+            self._sign(method, path, query_string, headers, payload_hash)
+
+        full_path = f"{path}?{query_string}" if query_string else path
+        status, response_headers, data = self._pool.request(method, full_path, body, headers)
+        if status not in expected:
+            raise ObjectStoreError(method, full_path, status, data)
+        return status, response_headers, data
+
+    def _list(self, prefix: str) -> Iterator[Tuple[str, str]]:
+        """
+        Lists all objects directly below ``prefix``, following the pagination of the store.
+
+        :return: An iterator over tuples ``(key, etag)``.
+        """
+        continuation_token = None
+        while True:
+            query = [("list-type", "2"), ("prefix", prefix), ("delimiter", "/"),
+                     ("max-keys", str(self.page_size))]
+            if continuation_token is not None:
+                query.append(("continuation-token", continuation_token))
+            _, _, data = self._request("GET", query=query)
+
+            root = ET.fromstring(data)
+            for content in _children(root, "Contents"):
+                yield _child_text(content, "Key") or "", _child_text(content, "ETag") or ""
+
+            if _child_text(root, "IsTruncated") != "true":
+                return
+            continuation_token = _child_text(root, "NextContinuationToken")
+
+    def _copy(self, source_key: str, target_key: str, exclusive: bool = False) -> None:
+        """
+        Copies ``source_key`` to ``target_key`` on the server. If ``exclusive``, the copy fails
+        with status 412 if ``target_key`` already exists.
+        """
+        headers = {"x-amz-copy-source": quote(f"/{self.bucket}/{source_key}", safe="/-_.~")}
+        if exclusive:
+            headers["If-None-Match"] = "*"
+        _, _, data = self._request("PUT", target_key, headers=headers)
+        # a copy can fail after the status was already sent
+        if _local_name(ET.fromstring(data)) == "Error":
+            raise ObjectStoreError("PUT", target_key, 200, data)
+
+    def _delete_many(self, keys: List[str]) -> None:
+        """
+        Deletes ``keys`` with as few multi-object delete requests as possible.
+        """
+        for start in range(0, len(keys), 1000):
+            root = ET.Element("Delete")
+            ET.SubElement(root, "Quiet").text = "true"
+            for key in keys[start:start + 1000]:
+                ET.SubElement(ET.SubElement(root, "Object"), "Key").text = key
+            body = ET.tostring(root)
+            md5 = base64.b64encode(hashlib.md5(body).digest()).decode()
+            _, _, data = self._request("POST", query=[("delete", "")], body=body,
+                                       headers={"Content-MD5": md5})
+            errors = list(_children(ET.fromstring(data), "Error"))
+            if errors:
+                raise ObjectStoreError("POST", "?delete", 200, ET.tostring(errors[0]))
+
+    # ---- DirectoryAdapter interface
+
+    def poll_directory(self, state: ConfigState) -> List[str]:
+        prefix = self._key(state, "")
+        listed = dict()
+        for key, etag in self._list(prefix):
+            identifier = key[len(prefix):]
+            if identifier.endswith('.yaml'):
+                listed[identifier] = etag
+        self._listed_etags[state] = listed
+        if state == ConfigState.planned:
+            for identifier in [i for i in self._config_cache if i not in listed]:
+                del self._config_cache[identifier]
+        return self._record_listing(list(listed), state)
+
+    def get_config(self, identifier: str) -> ConfigType:
+        key = self._key(ConfigState.planned, identifier)
+        cached = self._config_cache.get(identifier)
+
+        # the listing already told us the object did not change, no need for a round trip
+        listed_etag = self._listed_etags[ConfigState.planned].get(identifier)
+        if cached is not None and cached[0] == listed_etag:
+            return cached[1]
+
+        headers = {"If-None-Match": cached[0]} if cached is not None else {}
+        status, response_headers, data = self._request("GET", key, headers=headers,
+                                                       expected=(200, 304, 404))
+        if status == 404:
+            # another worker claimed the config since we listed it
+            self.identifier_states.pop(identifier, None)
+            self._forget_listing(identifier, ConfigState.planned)
+            raise ConfigNotFoundError(identifier)
+        if status == 304 and cached is not None:
+            return cached[1]
+
+        try:
+            config = load_config(data)
+        except (TypeError, _yaml_error()) as e:
+            print("There is an issue with the config", identifier)
+            print(e)
+            return None
+        self._config_cache[identifier] = (response_headers.get("etag", ""), config)
+        return config
+
+    def _forget_listing(self, identifier: str, state: ConfigState) -> None:
+        """
+        Drops the listed ETag and the cached config of a config that left ``state``.
+        """
+        self._listed_etags[state].pop(identifier, None)
+        if state == ConfigState.planned:
+            self._config_cache.pop(identifier, None)
+
+    def _move_to_state(self, identifier: str, old_state: ConfigState, new_state: ConfigState):
+        old_key = self._key(old_state, identifier)
+        exclusive = self.conditional_claims and new_state == ConfigState.active
+        try:
+            self._copy(old_key, self._key(new_state, identifier), exclusive)
+        except ObjectStoreError as e:
+            # 404: the config is gone, 412: another worker claimed it first
+            if e.status in (404, 412):
+                raise ConfigNotFoundError(identifier) from e
+            raise
+        self._request("DELETE", old_key, expected=(200, 204))
+        self._forget_listing(identifier, old_state)
+
+    def _move_many_to_state(self, identifiers: List[str], old_states: List[ConfigState],
+                            new_state: ConfigState) -> List[str]:
+        exclusive = self.conditional_claims and new_state == ConfigState.active
+        moved, copied_keys = [], []
+        try:
+            for identifier, old_state in zip(identifiers, old_states):
+                old_key = self._key(old_state, identifier)
+                try:
+                    self._copy(old_key, self._key(new_state, identifier), exclusive)
+                except ObjectStoreError as e:
+                    # see _move_to_state, another worker moved the config first
+                    if e.status in (404, 412):
+                        continue
+                    raise
+                moved.append(identifier)
+                copied_keys.append(old_key)
+        finally:
+            # even if a copy failed, the configs copied so far must not stay in both states
+            self._delete_many(copied_keys)
+            for identifier, old_state in zip(identifiers, old_states):
+                self._forget_listing(identifier, old_state)
+        return moved
+
+    def write_output(self, identifier: str, output: str) -> None:
+        # objects can't be appended to, so we have to read and rewrite the output
+        key = self._key(ConfigState.failed, identifier + ".out")
+        status, _, data = self._request("GET", key, expected=(200, 404))
+        previous = data if status == 200 else b""
+        self._request("PUT", key, body=previous + output.encode())
+
+    def write_artifact(self, identifier: str, suffix: str, data: bytes) -> None:
+        state = self.identifier_states[identifier]
+        self._request("PUT", self._key(state, identifier + suffix), body=data)
+
+    def write_progress(self, identifier: str, records: str) -> None:
+        # objects can't be appended to, so every chunk is stored as a separate object
+        prefix = f"{self.prefix}progress/{identifier}/"
+        if identifier not in self._progress_chunks:
+            self._progress_chunks[identifier] = sum(1 for _ in self._list(prefix))
+        chunk = self._progress_chunks[identifier]
+        self._request("PUT", f"{prefix}{chunk:08d}.jsonl", body=records.encode())
+        self._progress_chunks[identifier] = chunk + 1
+
+    def archive_progress(self, identifier: str) -> None:
+        self._progress_chunks.pop(identifier, None)
+        chunk_keys = sorted(key for key, _ in self._list(f"{self.prefix}progress/{identifier}/"))
+        if not chunk_keys:
+            return
+        records = b"".join(self._request("GET", key)[2] for key in chunk_keys)
+        state = self.identifier_states[identifier]
+        self._request("PUT", self._key(state, identifier + ".progress.jsonl"), body=records)
+        self._delete_many(chunk_keys)
+
+    def _metadata_key(self, identifier: str, name: str) -> str:
+        return f"{self.prefix}metadata/{identifier}/{name}.json"
+
+    def write_metadata(self, identifier: str, name: str, data: str) -> None:
+        # a single put replaces the object atomically
+        self._request("PUT", self._metadata_key(identifier, name), body=data.encode())
+
+    def read_metadata(self, identifier: str, name: str) -> Optional[str]:
+        status, _, data = self._request("GET", self._metadata_key(identifier, name),
+                                        expected=(200, 404))
+        return data.decode() if status == 200 else None
+
+    def delete_metadata(self, identifier: str, name: str) -> None:
+        self._request("DELETE", self._metadata_key(identifier, name), expected=(200, 204, 404))
+
+    def close(self) -> None:
+        """
+        Closes all pooled connections.
+        """
+        self._pool.close()
@@ -0,0 +1,103 @@
+import cProfile
+import marshal
+import random
+import tracemalloc
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class ProfilingOptions:
+    """
+    Options that control if and how a consumer invocation is profiled. Profiling results are
+    written through the ``DirectoryAdapter`` next to the config as ``[identifier].prof`` (cProfile
+    stats, readable with ``pstats.Stats``) and ``[identifier].mem.txt`` (top allocations).
+    """
+    sampling_rate: float = 1.0
+    """Fraction of runs that will be profiled, between 0 (never) and 1 (always)."""
+    cprofile: bool = True
+    """If true, the consumer is profiled with cProfile."""
+    tracemalloc: bool = False
+    """If true, memory allocations of the consumer are traced with tracemalloc."""
+    tracemalloc_top: int = 10
+    """Number of allocation sites listed in the memory summary."""
+    tracemalloc_frames: int = 1
+    """Number of frames stored per traced allocation."""
+
+    def should_profile(self) -> bool:
+        """
+        Draws whether the next run should be profiled according to ``sampling_rate``.
+        :return: True if the next run should be profiled.
+        """
+        return self.sampling_rate >= 1 or random.random() < self.sampling_rate
+
+
+class ConsumerProfiler:
+    """
+    A context manager that profiles the code executed inside of it according to the given
+    ``ProfilingOptions``. After exiting, the results can be retrieved with ``get_artifacts``.
+    """
+
+    def __init__(self, options: ProfilingOptions):
+        """
+        Create a profiler with the given ``options``.
+        :param options: The options that define which profilers are used.
+        """
+        self.options = options
+        self._profile: Optional[cProfile.Profile] = None
+        self._started_tracemalloc = False
+        self._artifacts: Dict[str, bytes] = dict()
+
+    def __enter__(self):
+        if self.options.tracemalloc:
+            # don't interfere with a tracemalloc session started by the user
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.options.tracemalloc_frames)
+                self._started_tracemalloc = True
+            if hasattr(tracemalloc, "reset_peak"):  # python >= 3.9
+                tracemalloc.reset_peak()
+        if self.options.cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.create_stats()
+            # same format as pstats.Stats.dump_stats
+            self._artifacts[".prof"] = marshal.dumps(self._profile.stats)  # type: ignore
+
+        if self.options.tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            self._artifacts[".mem.txt"] = _summarize_snapshot(
+                snapshot, current, peak, self.options.tracemalloc_top).encode()
+
+        return False
+
+    def get_artifacts(self) -> Dict[str, bytes]:
+        """
+        Returns the profiling results collected so far.
+        :return: A dictionary that maps file suffixes to the content of the file.
+        """
+        return self._artifacts
+
+
+def _summarize_snapshot(snapshot: tracemalloc.Snapshot, current: int, peak: int,
+                        top: int) -> str:
+    """
+    Creates a human-readable summary of the largest allocation sites in ``snapshot``.
+
+    :param snapshot: The tracemalloc snapshot.
+    :param current: The size of currently traced memory in bytes.
+    :param peak: The peak size of traced memory in bytes.
+    :param top: The number of allocation sites to list.
+    :return: The summary as a string.
+    """
+    lines = [f"current: {current / 1024:.1f} KiB, peak: {peak / 1024:.1f} KiB",
+             f"top {top} allocation sites:"]
+    lines.extend(str(stat) for stat in snapshot.statistics('lineno')[:top])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,105 @@
+import json
+import threading
+from time import time
+from typing import Any, Callable, List, Optional
+
+from .directory_adapters import DirectoryAdapter
+
+
+class ProgressWriter:
+    """
+    Buffers progress records of a consumer and writes them through the ``DirectoryAdapter`` as
+    newline-delimited json. The buffer is flushed when it exceeds ``buffer_size`` bytes, when
+    ``flush_interval`` seconds passed since the last flush or when the writer is closed, so the
+    memory used stays bounded no matter how many records are written. While the writer is used
+    as a context manager, a background thread flushes the buffer every ``flush_interval``
+    seconds, so records are written even if the consumer does not yield for a long time.
+    Records are dropped if the adapter does not support progress. If writing fails, the error is
+    passed to ``on_error`` and all further records are dropped as well.
+    """
+
+    def __init__(self, directory: DirectoryAdapter, identifier: str, buffer_size: int = 64 * 1024,
+                 flush_interval: float = 10.,
+                 on_error: Optional[Callable[[Exception], None]] = None):
+        """
+        Create a writer for the progress of the config with the given ``identifier``.
+        :param directory: The adapter used to write the records.
+        :param identifier: The identifier of the config.
+        :param buffer_size: Maximum number of buffered bytes before the buffer is flushed.
+        :param flush_interval: Maximum number of seconds between two flushes.
+        :param on_error: Called with the exception if writing fails, possibly from the flushing
+        thread. If None, the exception is raised by the next ``write`` or ``flush`` instead.
+        """
+        self.directory = directory
+        self.identifier = identifier
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self.failed = False
+
+        self._buffer: List[str] = []
+        self._buffered_bytes = 0
+        self._time_of_last_flush = time()
+
+        # the buffer is shared with the flushing thread
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._flush_regularly, daemon=True)
+
+    def write(self, record: Any) -> None:
+        """
+        Adds ``record`` to the buffer and flushes it if necessary.
+        :param record: A json-serializable progress record.
+        """
+        if self.failed or not self.directory.supports_progress:
+            return
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered_bytes += len(line)
+
+            if (self._buffered_bytes >= self.buffer_size
+                    or time() - self._time_of_last_flush >= self.flush_interval):
+                self._flush()
+
+    def flush(self) -> None:
+        """
+        Writes all buffered records.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buffer and not self.failed:
+            try:
+                self.directory.write_progress(self.identifier, "".join(self._buffer))
+            except Exception as e:
+                if self.on_error is None:
+                    raise
+                self.failed = True
+                self.on_error(e)
+            self._buffer.clear()
+            self._buffered_bytes = 0
+        self._time_of_last_flush = time()
+
+    def _flush_regularly(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # without on_error, the records stay buffered and the next flush of the
+                # consumer raises the error
+                return
+
+    def __enter__(self):
+        # with a non-positive interval, every write flushes anyway
+        if self.flush_interval > 0:
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+        return False
@@ -0,0 +1,55 @@
+import json
+import os
+from dataclasses import dataclass, asdict
+from typing import Optional, Union, List
+
+
+@dataclass
+class RunRecord:
+    """
+    Timing information about a single config run collected by the ``SchedulingClient``. All
+    times are in seconds.
+    """
+    identifier: str
+    config_class: str
+    arrival: float
+    """Time at which the client first found the config in the planned directory."""
+    parse_time: float
+    """Time it took to load the config."""
+    start: float
+    """Time at which the consumer was started."""
+    run_duration: float
+    """Time it took to run the consumer."""
+    status: str
+    """``completed`` or ``failed``."""
+    submitter: Optional[str] = None
+
+
+class RunRecordLog:
+    """
+    Appends ``RunRecord`` objects to a local file as newline-delimited json. The records can be
+    used to replay the workload in ``simulation.simulate``.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        """
+        Create a log that appends to the file at ``path``.
+        :param path: The path of the log file.
+        """
+        self.path = path
+
+    def append(self, record: RunRecord) -> None:
+        """
+        Appends ``record`` to the log.
+        :param record: The record to append.
+        """
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(asdict(record)) + "\n")
+
+    def load(self) -> List[RunRecord]:
+        """
+        Reads all records from the log.
+        :return: A list of all records in the order they were appended.
+        """
+        with open(self.path) as file:
+            return [RunRecord(**json.loads(line)) for line in file if line.strip()]
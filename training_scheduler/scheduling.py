@@ -0,0 +1,149 @@
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
+from .directory_adapters import ConfigType
+
+
+class _DeficitRoundRobin:
+    """
+    Deficit round-robin over a set of queues identified by keys. Every time a queue gets its
+    turn, its deficit grows by its weight, and it may dispatch one item per unit of deficit
+    before the turn passes to the next queue. Over time, each non-empty queue is served
+    proportionally to its weight.
+    """
+
+    def __init__(self, weight_fn: Callable[[Any], float],
+                 child_factory: Callable[[], Any]):
+        """
+        :param weight_fn: Returns the weight of the queue with the given key.
+        :param child_factory: Creates a new, empty queue for a key.
+        """
+        self.weight_fn = weight_fn
+        self.child_factory = child_factory
+        self.children: Dict[Any, Any] = dict()
+        self.deficits: Dict[Any, float] = dict()
+        self.active: Deque[Any] = deque()
+        self._in_turn: Set[Any] = set()
+
+    def __len__(self):
+        return sum(len(child) for child in self.children.values())
+
+    def child(self, key: Any) -> Any:
+        """
+        Returns the queue for ``key`` and schedules it if it is new.
+        """
+        if key not in self.children:
+            if self.weight_fn(key) <= 0:
+                raise ValueError(f"The weight of {key} must be positive.")
+            self.children[key] = self.child_factory()
+            self.deficits[key] = 0.
+            self.active.append(key)
+        return self.children[key]
+
+    def pop_key(self, allowed: Callable[[Any], bool] = lambda key: True) \
+            -> Optional[Any]:
+        """
+        Determines which queue may dispatch the next item and charges it for the item.
+
+        :param allowed: Queues for which this returns False are skipped in this round.
+        :return: The key of the queue or None if no allowed queue has items.
+        """
+        if not any(allowed(key) for key in self.active):
+            return None
+
+        while True:
+            key = self.active[0]
+            if not allowed(key):
+                self._in_turn.discard(key)
+                self.active.rotate(-1)
+                continue
+
+            if key not in self._in_turn:
+                self.deficits[key] += self.weight_fn(key)
+                self._in_turn.add(key)
+
+            if self.deficits[key] >= 1:
+                self.deficits[key] -= 1
+                return key
+
+            # the turn of this queue is over
+            self._in_turn.discard(key)
+            self.active.rotate(-1)
+
+    def remove_if_empty(self, key: Any) -> None:
+        """
+        Removes the queue for ``key`` if it has no items left. As usual in deficit round-robin,
+        its deficit is not carried over to when it becomes busy again.
+        """
+        if len(self.children[key]) == 0:
+            del self.children[key]
+            del self.deficits[key]
+            self._in_turn.discard(key)
+            self.active.remove(key)
+
+
+class FairShareQueue:
+    """
+    A queue of planned configs that dispatches them with weighted fair share across config
+    classes and, within each class, across submitters. A large sweep of one class or submitter
+    therefore can't starve configs of others, which are dispatched interleaved with the sweep
+    according to their weights.
+    """
+
+    def __init__(self,
+                 class_weights: Optional[Dict[type, float]] = None,
+                 submitter_field: Optional[str] = None,
+                 submitter_weights: Optional[Dict[Any, float]] = None):
+        """
+        Create an empty queue.
+        :param class_weights: The weight of each config class (defaults to 1 for every class).
+        :param submitter_field: The name of an attribute of the configs that identifies their
+        submitter. If None, all configs of a class are treated as coming from the same submitter.
+        :param submitter_weights: The weight of each submitter (defaults to 1 for every
+        submitter).
+        """
+        self.class_weights = class_weights or dict()
+        self.submitter_field = submitter_field
+        self.submitter_weights = submitter_weights or dict()
+
+        self._classes = _DeficitRoundRobin(
+            lambda cls: self.class_weights.get(cls, 1.),  # type: ignore
+            lambda: _DeficitRoundRobin(lambda s: self.submitter_weights.get(s, 1.), deque))
+        self._queued: Set[str] = set()
+
+    def __len__(self):
+        return len(self._queued)
+
+    def __contains__(self, identifier: str) -> bool:
+        return identifier in self._queued
+
+    def push(self, identifier: str, config: ConfigType) -> None:
+        """
+        Adds a config to the queue.
+        :param identifier: The identifier of the config.
+        :param config: The config object.
+        """
+        submitter = getattr(config, self.submitter_field, None) if self.submitter_field else None
+        self._classes.child(type(config)).child(submitter).append((identifier, config))
+        self._queued.add(identifier)
+
+    def pop(self, allowed: Callable[[type], bool] = lambda cls: True) \
+            -> Optional[Tuple[str, ConfigType]]:
+        """
+        Removes the config that should be dispatched next from the queue.
+        :param allowed: Config classes for which this returns False are not dispatched, e.g.
+        because they reached their concurrency limit.
+        :return: A tuple ``(identifier, config)`` or None if no allowed config is queued.
+        """
+        cls = self._classes.pop_key(allowed)  # type: ignore
+        if cls is None:
+            return None
+
+        submitters = self._classes.children[cls]
+        submitter = submitters.pop_key()
+        identifier, config = submitters.children[submitter].popleft()
+
+        submitters.remove_if_empty(submitter)
+        self._classes.remove_if_empty(cls)
+        self._queued.discard(identifier)
+        return identifier, config
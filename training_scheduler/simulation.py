@@ -0,0 +1,325 @@
+import heapq
+import json
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional, Tuple, Type, Any, Sequence
+
+from .checkpoints import Lease
+from .client import SchedulingClient
+from .directory_adapters import DirectoryAdapter, ConfigState, ConfigType, ConfigNotFoundError
+from .records import RunRecord
+
+
+class _SimulationFinished(BaseException):
+    """
+    Raised in the worker threads to end their run loops once the workload is done. It is no
+    ``Exception``, so the client does not mistake it for a failing consumer.
+    """
+
+
+class VirtualClock:
+    """
+    A clock for a discrete-event simulation of several workers, each running in its own thread.
+    Only one worker runs at a time. When it sleeps, the clock jumps to the earliest time at which
+    a worker wakes up and hands control to that worker, so a simulation takes as long as the
+    dispatch logic needs to run, not as long as the simulated time span.
+    """
+
+    def __init__(self, is_finished):
+        """
+        Create a clock starting at time 0.
+        :param is_finished: Called whenever the clock advances. If it returns True, all workers
+        are stopped.
+        """
+        self.now = 0.
+        self.is_finished = is_finished
+        self.finished = False
+
+        self._condition = threading.Condition()
+        self._wakeups: List[Tuple[float, int, int]] = []
+        self._sequence = 0
+        self._running: Optional[int] = None
+        self._debts: Dict[int, float] = dict()
+
+    def time(self) -> float:
+        """
+        :return: The current virtual time.
+        """
+        return self.now
+
+    def charge(self, delta: float) -> None:
+        """
+        Charges the current worker ``delta`` seconds, which are added to its next sleep. This
+        models work that blocks the worker without handing control to other workers in between.
+        """
+        me = threading.get_ident()
+        self._debts[me] = self._debts.get(me, 0.) + delta
+
+    def sleep(self, delta: float) -> None:
+        """
+        Suspends the current worker for ``delta`` virtual seconds plus its charged time.
+        """
+        me = threading.get_ident()
+        with self._condition:
+            self._schedule(me, self.now + max(delta, 0.) + self._debts.pop(me, 0.))
+            self._advance()
+            self._wait_for_turn(me)
+
+    def _schedule(self, worker: int, at: float) -> None:
+        heapq.heappush(self._wakeups, (at, self._sequence, worker))
+        self._sequence += 1
+
+    def _advance(self) -> None:
+        if self.is_finished() or not self._wakeups:
+            self.finished = True
+            self._running = None
+        else:
+            self.now, _, self._running = heapq.heappop(self._wakeups)
+        self._condition.notify_all()
+
+    def _wait_for_turn(self, me: int) -> None:
+        while self._running != me and not self.finished:
+            self._condition.wait()
+        if self.finished:
+            raise _SimulationFinished()
+
+    def run_workers(self, targets: Sequence) -> None:
+        """
+        Runs each of the given functions in its own worker thread until the simulation is
+        finished.
+        :param targets: Functions that will be called without parameters.
+        """
+        started = threading.Barrier(len(targets) + 1)
+        errors: List[Exception] = []
+
+        def run(target):
+            me = threading.get_ident()
+            with self._condition:
+                self._schedule(me, 0.)
+            started.wait()
+            try:
+                with self._condition:
+                    self._wait_for_turn(me)
+                target()
+            except _SimulationFinished:
+                return
+            except Exception as e:
+                # stop all other workers, the simulation is broken anyway
+                errors.append(e)
+                with self._condition:
+                    self.finished = True
+                    self._condition.notify_all()
+                return
+            # the worker stopped on its own, so someone else has to continue
+            with self._condition:
+                self._advance()
+
+        threads = [threading.Thread(target=run, args=(t,), daemon=True) for t in targets]
+        for thread in threads:
+            thread.start()
+        started.wait()
+        with self._condition:
+            self._advance()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+
+class _SimulatedStore:
+    """
+    The shared state of the in-memory directory that all simulated workers poll.
+    """
+
+    def __init__(self, clock: VirtualClock, records: List[RunRecord],
+                 config_classes: Dict[str, Type]):
+        self.clock = clock
+        self.config_classes = config_classes
+        self.pending = deque(sorted(records, key=lambda r: r.arrival))
+        self.records = {r.identifier: r for r in records}
+        self.states: Dict[ConfigState, Dict[str, None]] = {s: dict() for s in ConfigState}
+        self.claim_times: Dict[str, float] = dict()
+        self.finish_times: Dict[str, float] = dict()
+
+    def release_arrivals(self) -> None:
+        while self.pending and self.pending[0].arrival <= self.clock.now:
+            self.states[ConfigState.planned][self.pending.popleft().identifier] = None
+
+    def is_drained(self) -> bool:
+        return not self.pending and not self.states[ConfigState.planned] \
+               and not self.states[ConfigState.active]
+
+
+class SimulatedDirectoryAdapter(DirectoryAdapter):
+    """
+    An in-memory ``DirectoryAdapter`` for the simulator. Configs appear in the planned state at
+    their arrival time and loading them charges their parse time on the virtual clock. For
+    active configs it reports leases of their (simulated) owners, so ``max_active`` limits work
+    as they would with real workers.
+    """
+
+    def __init__(self, store: _SimulatedStore):
+        super(SimulatedDirectoryAdapter, self).__init__()
+        self.store = store
+
+    def poll_directory(self, state: ConfigState) -> List[str]:
+        if state == ConfigState.planned:
+            self.store.release_arrivals()
+        return self._record_listing(list(self.store.states[state]), state)
+
+    def get_config(self, identifier: str) -> ConfigType:
+        record = self.store.records[identifier]
+        self.store.clock.charge(record.parse_time)
+        config = self.store.config_classes[record.config_class]()
+        config.record = record
+        config.submitter = record.submitter
+        return config
+
+    def _move_to_state(self, identifier: str, old_state: ConfigState, new_state: ConfigState):
+        if identifier not in self.store.states[old_state]:
+            raise ConfigNotFoundError(identifier)
+        del self.store.states[old_state][identifier]
+        self.store.states[new_state][identifier] = None
+        if new_state == ConfigState.active:
+            self.store.claim_times[identifier] = self.store.clock.now
+        elif new_state in (ConfigState.completed, ConfigState.failed):
+            self.store.finish_times[identifier] = self.store.clock.now
+
+    def write_output(self, identifier: str, output: str) -> None:
+        pass
+
+    supports_metadata = True
+
+    def write_metadata(self, identifier: str, name: str, data: str) -> None:
+        pass
+
+    def delete_metadata(self, identifier: str, name: str) -> None:
+        pass
+
+    def read_metadata(self, identifier: str, name: str) -> Optional[str]:
+        if name != Lease.name or identifier not in self.store.states[ConfigState.active]:
+            return None
+        # the owner is alive as long as the config is active, so the lease is always fresh
+        lease = Lease("simulated", "simulated", 0, float("inf"),
+                      self.store.records[identifier].config_class)
+        return json.dumps(asdict(lease))
+
+
+@dataclass
+class SimulationReport:
+    """
+    Predicted queue metrics of a simulated workload. Times are in seconds.
+    """
+    workers: int
+    min_polling_interval: float
+    completed: int
+    makespan: float
+    """Time from the first arrival until the last config finished."""
+    throughput: float
+    """Finished configs per hour."""
+    wait_percentiles: Dict[int, float] = field(default_factory=dict)
+    """Percentiles (50, 90, 99) of the time between arrival and start of a config."""
+    utilization: float = 0.
+    """Fraction of the makespan the workers spent parsing and running configs."""
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))]
+
+
+def simulate(records: Sequence[RunRecord], workers: int = 1, min_polling_interval: float = 10,
+             class_settings: Optional[Dict[str, Dict[str, Any]]] = None,
+             submitter_weights: Optional[Dict[Any, float]] = None) -> SimulationReport:
+    """
+    Replays ``records`` through the dispatch logic of ``workers`` ``SchedulingClient`` instances
+    that share an in-memory directory, using a virtual clock. Arrival times are taken relative to
+    the earliest arrival, the parse and run durations of the records are used as they are.
+
+    :param records: Historical records, see ``records.RunRecordLog``, or a synthetic workload,
+    see ``synthetic_workload``.
+    :param workers: The number of simulated workers.
+    :param min_polling_interval: The ``min_polling_interval`` of every worker.
+    :param class_settings: Keyword arguments for ``register_config`` by config class name, e.g.
+    ``{"SweepConfig": {"weight": 2., "max_active": 4}}``.
+    :param submitter_weights: Fair-share weights of the submitters of the records.
+    :return: The predicted metrics.
+    """
+    if not records:
+        raise ValueError("There are no records to simulate.")
+    if min_polling_interval <= 0:
+        raise ValueError("The simulation requires a positive min_polling_interval.")
+
+    offset = min(r.arrival for r in records)
+    records = [RunRecord(**{**asdict(r), "arrival": r.arrival - offset}) for r in records]
+    class_settings = class_settings or dict()
+
+    config_classes = {name: type(name, (), {"record": None, "submitter": None})
+                      for name in {r.config_class for r in records}}
+
+    store: _SimulatedStore
+    clock = VirtualClock(lambda: store.is_drained())
+    store = _SimulatedStore(clock, records, config_classes)
+    busy_time = sum(r.parse_time + r.run_duration for r in records)
+
+    def consumer(config, identifier):
+        clock.sleep(config.record.run_duration)
+        return None if config.record.status == "completed" else config.record.status
+
+    clients = []
+    for _ in range(workers):
+        client = SchedulingClient(SimulatedDirectoryAdapter(store), min_polling_interval,
+                                  callback=None, heartbeat_interval=None,
+                                  submitter_field="submitter",
+                                  submitter_weights=submitter_weights)
+        client._time = clock.time
+        client._sleep = clock.sleep
+        for name, cls in config_classes.items():
+            client.register_config(cls, consumer, **class_settings.get(name, dict()))
+        clients.append(client)
+
+    clock.run_workers([lambda c=c: c.run() for c in clients])
+
+    waits = [store.claim_times[i] - store.records[i].arrival for i in store.claim_times]
+    makespan = max(store.finish_times.values(), default=0.)
+    return SimulationReport(
+        workers=workers,
+        min_polling_interval=min_polling_interval,
+        completed=len(store.finish_times),
+        makespan=makespan,
+        throughput=len(store.finish_times) / makespan * 3600 if makespan > 0 else 0.,
+        wait_percentiles={p: _percentile(waits, p) for p in (50, 90, 99)},
+        utilization=busy_time / (makespan * workers) if makespan > 0 else 0.)
+
+
+def synthetic_workload(n: int, arrival_rate: float, mean_run_duration: float,
+                       config_classes: Sequence[str] = ("SyntheticConfig",),
+                       parse_time: float = 0.01, failure_rate: float = 0.,
+                       seed: Optional[int] = None) -> List[RunRecord]:
+    """
+    Creates ``n`` records with exponentially distributed inter-arrival times and run durations.
+
+    :param n: The number of configs.
+    :param arrival_rate: The mean number of arriving configs per second.
+    :param mean_run_duration: The mean run duration in seconds.
+    :param config_classes: Names of config classes the configs are drawn from uniformly.
+    :param parse_time: The parse time of each config in seconds.
+    :param failure_rate: The probability of a run to fail.
+    :param seed: A seed for the random number generator.
+    :return: A list of records that can be passed to ``simulate``.
+    """
+    rng = random.Random(seed)
+    records = []
+    arrival = 0.
+    for i in range(n):
+        arrival += rng.expovariate(arrival_rate)
+        records.append(RunRecord(
+            identifier=f"synthetic_{i}.yaml", config_class=rng.choice(config_classes),
+            arrival=arrival, parse_time=parse_time, start=0.,
+            run_duration=rng.expovariate(1 / mean_run_duration),
+            status="failed" if rng.random() < failure_rate else "completed"))
+    return records